@@ -0,0 +1,217 @@
+"""Headless benchmarks for the geohash pipelines, with regression checks.
+
+Each stage runs in a fresh process; the best wall time over ``--repeat``
+runs is recorded with the peak RSS of that process (native GEOS/Arrow
+memory included) and, from one extra traced run, the peak of the Python
+and NumPy allocations of the stage alone.  Results are written to JSON and,
+when a baseline is given, any stage slower (or hungrier) than the baseline by
+more than ``--threshold`` fails the run with exit code 1.
+
+    python -m benchmarks.run                           # run and record
+    python -m benchmarks.run --update-baseline         # record as new baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+PROV_FILE = ROOT / "pages" / "batas_admin_provinsi.geojson"
+DEFAULT_OUTPUT = ROOT / "benchmarks" / "results.json"
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+
+# Ukuran wilayah untuk polyfill: kecil, sedang, besar
+POLYFILL_REGIONS = {
+    "small": "DKI Jakarta",
+    "medium": "Jawa Barat",
+    "large": "Kalimantan Tengah",
+}
+EXPORT_REGION = "Kalimantan Tengah"
+MEMORY_SLACK_MB = 5.0
+
+
+def _province(name):
+    from karta.boundaries import open_boundaries
+    with tempfile.TemporaryDirectory() as store_dir:
+        return open_boundaries(PROV_FILE, "PROVINSI", store_dir=store_dir).geometry(name)
+
+
+def _synthetic_codes(rows, seed=0):
+    from karta import codec
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-11.0, 6.0, rows)
+    lon = rng.uniform(95.0, 141.0, rows)
+    return codec.encode_int(lat, lon, 6)
+
+
+# --- Stages -----------------------------------------------------------------
+# Setiap stage: setup(args, workdir) -> callable tanpa argumen yang diukur.
+
+def setup_polyfill(size):
+    def setup(args, workdir):
+        from karta.polyfill import polyfill
+        geom = _province(POLYFILL_REGIONS[size])
+        return lambda: polyfill(geom, 6)
+    return setup
+
+
+def setup_export_geojson(args, workdir):
+    from karta.export import geojson_buffer
+    from karta.polyfill import polyfill
+    codes = polyfill(_province(EXPORT_REGION), 6)
+    return lambda: geojson_buffer(codes, 6)
+
+
+def setup_export_csv(args, workdir):
+    from karta.export import geohash_csv
+    from karta.polyfill import polyfill
+    codes = polyfill(_province(EXPORT_REGION), 6)
+    return lambda: geohash_csv(codes, 6)
+
+
+def setup_csv_to_geojson(args, workdir):
+    import pandas as pd
+    from karta import codec
+    from karta.convert import csv_to_geojson
+    codes = _synthetic_codes(args.rows)
+    src = Path(workdir) / "synthetic.csv"
+    pd.DataFrame({
+        "geoHash": codec.to_str(codes, 6),
+        "value": np.arange(len(codes)),
+    }).to_csv(src, index=False)
+    dest = Path(workdir) / "synthetic.geojson"
+    return lambda: csv_to_geojson(src, dest)
+
+
+def setup_geojson_to_csv(args, workdir):
+    from karta.convert import geojson_to_csv
+    from karta.export import write_geojson
+    src = Path(workdir) / "synthetic.geojson"
+    with open(src, "wb") as f:
+        write_geojson(f, np.unique(_synthetic_codes(args.rows // 4)), 6)
+    dest = Path(workdir) / "synthetic.csv"
+    return lambda: geojson_to_csv(src, dest)
+
+
+STAGES = {
+    "polyfill_small": setup_polyfill("small"),
+    "polyfill_medium": setup_polyfill("medium"),
+    "polyfill_large": setup_polyfill("large"),
+    "export_geojson": setup_export_geojson,
+    "export_csv": setup_export_csv,
+    "csv_to_geojson": setup_csv_to_geojson,
+    "geojson_to_csv": setup_geojson_to_csv,
+}
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_stage(name, args):
+    """Run one stage in the current (fresh) process."""
+    with tempfile.TemporaryDirectory() as workdir:
+        func = STAGES[name](args, workdir)
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        # Peak RSS absolut proses stage (termasuk setup dan memori native), sebelum tracing dinyalakan
+        peak_mb = _peak_rss_mb()
+
+        # tracemalloc tidak melihat alokasi native, jadi hanya dicatat sebagai angka tambahan
+        tracemalloc.start()
+        func()
+        traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            "seconds": min(times),
+            "peak_mb": peak_mb,
+            "traced_mb": traced / (1024 * 1024),
+            "repeat": args.repeat,
+        }
+
+
+def run_stages(names, args):
+    results = {}
+    for name in names:
+        # Proses baru per stage agar memori tidak terbawa dari stage lain
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results[name] = pool.submit(_run_stage, name, args).result()
+        r = results[name]
+        print(f"{name:<18} {r['seconds']:>9.3f} s {r['peak_mb']:>9.1f} MB {r['traced_mb']:>9.1f} MB traced")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names and messages of stages that regressed against ``baseline``."""
+    failures = []
+    for name, result in results.items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            continue
+        if result["seconds"] > base["seconds"] * (1 + threshold):
+            failures.append(f"{name}: time {result['seconds']:.3f}s > baseline {base['seconds']:.3f}s")
+        if result["peak_mb"] > base["peak_mb"] * (1 + threshold) + MEMORY_SLACK_MB:
+            failures.append(f"{name}: memory {result['peak_mb']:.1f}MB > baseline {base['peak_mb']:.1f}MB")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stage names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=200_000, help="rows in synthetic CSV inputs")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.stages.split(",") if n.strip()]
+    unknown = set(names) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rows": args.rows,
+        },
+        "stages": run_stages(names, args),
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if args.baseline.exists():
+        failures = compare(report["stages"], json.loads(args.baseline.read_text()), args.threshold)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
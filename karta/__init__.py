@@ -0,0 +1 @@
+"""Shared geohash helpers for the Karta IoT Tools pages."""
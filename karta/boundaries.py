@@ -0,0 +1,112 @@
+"""Columnar admin boundary store (Arrow IPC with WKB geometry).
+
+Each boundary GeoJSON is converted once into an Arrow IPC file with one
+record batch per region (``name``, bbox columns, ``geometry`` as WKB).  The
+sorted region names live in the schema metadata, so listing them reads only
+the file footer; a region's geometry is read by batch offset from a memory
+map, never the whole file.
+"""
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import pyarrow as pa
+import shapely
+from shapely.geometry import mapping
+
+from karta.cover_store import ROOT, file_hash, group_features
+from karta.polyfill import geometry_from_geojson
+
+DEFAULT_STORE_DIR = ROOT / "data" / "boundaries"
+
+SCHEMA = pa.schema([
+    ("name", pa.string()),
+    ("minx", pa.float64()),
+    ("miny", pa.float64()),
+    ("maxx", pa.float64()),
+    ("maxy", pa.float64()),
+    ("geometry", pa.binary()),
+])
+
+
+def convert_boundaries(boundary_path, field, path):
+    """Convert a boundary GeoJSON into an Arrow IPC store at ``path``."""
+    with open(boundary_path, "r", encoding="utf-8") as f:
+        groups = group_features(json.load(f), field)
+    names = sorted(groups)
+
+    schema = SCHEMA.with_metadata({
+        "field": field,
+        "names": json.dumps(names, ensure_ascii=False),
+    })
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_", suffix=".arrow")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for name in names:
+                geom = geometry_from_geojson({"type": "FeatureCollection", "features": groups[name]})
+                minx, miny, maxx, maxy = geom.bounds
+                writer.write_batch(pa.record_batch(
+                    [[name], [minx], [miny], [maxx], [maxy], [shapely.to_wkb(geom)]],
+                    schema=schema,
+                ))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+class BoundaryStore:
+    """Memory-mapped reader over a converted boundary file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._reader = pa.ipc.open_file(pa.memory_map(str(self.path), "r"))
+        metadata = self._reader.schema.metadata
+        self.field = metadata[b"field"].decode("utf-8")
+        self.names = json.loads(metadata[b"names"])
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def _row(self, name):
+        with self._lock:
+            return self._reader.get_batch(self._index[name]).to_pylist()[0]
+
+    def bounds(self, name):
+        """``(minx, miny, maxx, maxy)`` of region ``name``."""
+        row = self._row(name)
+        return row["minx"], row["miny"], row["maxx"], row["maxy"]
+
+    def geometry(self, name):
+        """Shapely geometry of region ``name``."""
+        return shapely.from_wkb(self._row(name)["geometry"])
+
+    def geojson(self, name):
+        """Region ``name`` as a one-feature GeoJSON FeatureCollection."""
+        return {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": mapping(self.geometry(name)),
+                "properties": {self.field: name},
+            }],
+        }
+
+
+def open_boundaries(boundary_path, field, store_dir=DEFAULT_STORE_DIR):
+    """Open the store for a boundary file, converting it first if needed."""
+    path = Path(store_dir) / f"{Path(boundary_path).stem}_{field}_{file_hash(boundary_path)}.arrow"
+    if not path.exists():
+        convert_boundaries(boundary_path, field, path)
+        for old in Path(store_dir).glob(f"{Path(boundary_path).stem}_{field}_*.arrow"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    return BoundaryStore(path)
@@ -0,0 +1,64 @@
+"""Connected-component labelling of geohash covers on the cell grid.
+
+Components are found with a vectorized union-find over integer neighbour
+pairs (hook larger root onto smaller, then path-compress by pointer
+jumping), so no polygon geometry or unary union is ever built.
+"""
+import numpy as np
+
+from karta.neighbors import neighbors
+
+
+def _edges(codes, precision, connectivity):
+    """Index pairs ``(i, j)`` of member cells that are neighbours."""
+    nbs, valid = neighbors(codes, precision, connectivity)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    pos = np.minimum(np.searchsorted(sorted_codes, nbs), len(codes) - 1)
+    hit = valid & (sorted_codes[pos] == nbs)
+    src = np.broadcast_to(np.arange(len(codes))[:, None], nbs.shape)[hit]
+    return src, order[pos[hit]]
+
+
+def _components(n, src, dst):
+    parent = np.arange(n)
+    while True:
+        ps, pd = parent[src], parent[dst]
+        lo, hi = np.minimum(ps, pd), np.maximum(ps, pd)
+        merge = lo != hi
+        if not merge.any():
+            return parent
+        np.minimum.at(parent, hi[merge], lo[merge])
+        # Path compression: lompat ke kakek sampai tiap node menunjuk akar
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+
+def label_clusters(codes, precision=6, connectivity=8):
+    """Cluster id per input cell; 0 is the largest cluster, 1 the next, and so on."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    if len(codes) == 0:
+        return np.empty(0, dtype=np.int64)
+    src, dst = _edges(codes, precision, connectivity)
+    roots = _components(len(codes), src, dst)
+
+    uniq, inverse, sizes = np.unique(roots, return_inverse=True, return_counts=True)
+    # Urutkan cluster dari yang terbesar; seri diputus oleh akar terkecil
+    rank = np.empty(len(uniq), dtype=np.int64)
+    rank[np.lexsort((uniq, -sizes))] = np.arange(len(uniq))
+    return rank[inverse]
+
+
+def select_clusters(labels, top_n=None, min_size=None):
+    """Mask of cells in the ``top_n`` largest clusters and/or clusters of ``min_size``+ cells."""
+    labels = np.asarray(labels)
+    keep = np.ones(len(labels), dtype=bool)
+    if top_n is not None:
+        keep &= labels < top_n
+    if min_size is not None:
+        sizes = np.bincount(labels, minlength=1)
+        keep &= sizes[labels] >= min_size
+    return keep
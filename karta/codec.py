@@ -0,0 +1,175 @@
+"""Vectorized geohash encode/decode on NumPy arrays.
+
+A geohash is handled either as a string or as its integer code: the
+interleaved lon/lat bits, 5 per character, most significant first.  All
+functions take and return whole arrays so pages never loop per row.
+"""
+import numpy as np
+import shapely
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 12
+
+_ALPHABET = np.frombuffer(BASE32.encode("ascii"), dtype=np.uint8).astype(np.uint32)
+_LOOKUP = np.full(128, 255, dtype=np.uint8)
+for _i, _c in enumerate(BASE32):
+    _LOOKUP[ord(_c)] = _i
+    _LOOKUP[ord(_c.upper())] = _i
+
+
+def _bit_split(precision):
+    """Number of lon and lat bits in a geohash of ``precision`` characters."""
+    total = 5 * np.asarray(precision, dtype=np.int64)
+    return (total + 1) // 2, total // 2
+
+
+_SPREAD_MASKS = [
+    (16, 0x0000FFFF0000FFFF),
+    (8, 0x00FF00FF00FF00FF),
+    (4, 0x0F0F0F0F0F0F0F0F),
+    (2, 0x3333333333333333),
+    (1, 0x5555555555555555),
+]
+_GATHER_MASKS = [
+    (1, 0x3333333333333333),
+    (2, 0x0F0F0F0F0F0F0F0F),
+    (4, 0x00FF00FF00FF00FF),
+    (8, 0x0000FFFF0000FFFF),
+    (16, 0x00000000FFFFFFFF),
+]
+
+
+def _spread(values, offset):
+    """Scatter the bits of ``values`` onto every other bit of a code, from ``offset``."""
+    out = np.asarray(values, dtype=np.uint64)
+    for shift, mask in _SPREAD_MASKS:
+        out = (out | (out << np.uint64(shift))) & np.uint64(mask)
+    return out << np.asarray(offset).astype(np.uint64)
+
+
+def _gather(codes, offset):
+    """Inverse of :func:`_spread`."""
+    out = (np.asarray(codes, dtype=np.uint64) >> np.asarray(offset).astype(np.uint64))
+    out = out & np.uint64(0x5555555555555555)
+    for shift, mask in _GATHER_MASKS:
+        out = (out | (out >> np.uint64(shift))) & np.uint64(mask)
+    return out
+
+
+def to_xy(codes, precision=6):
+    """Column (lon) and row (lat) grid indices of cells at ``precision``."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    lon_off = (5 * np.asarray(precision, dtype=np.int64) - 1) % 2
+    return _gather(codes, lon_off), _gather(codes, 1 - lon_off)
+
+
+def from_xy(x, y, precision=6):
+    """Inverse of :func:`to_xy`."""
+    lon_off = (5 * np.asarray(precision, dtype=np.int64) - 1) % 2
+    return _spread(x, lon_off) | _spread(y, 1 - lon_off)
+
+
+def grid_shape(precision=6):
+    """Number of cell columns and rows covering the globe at ``precision``."""
+    lon_bits, lat_bits = _bit_split(precision)
+    return 1 << int(lon_bits), 1 << int(lat_bits)
+
+
+def encode_int(lat, lon, precision=6):
+    """Integer geohash codes for arrays of latitude/longitude."""
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(f"precision must be between 1 and {MAX_PRECISION}")
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lon_bits, lat_bits = _bit_split(precision)
+
+    lon_idx = np.floor((lon + 180.0) / 360.0 * (1 << int(lon_bits)))
+    lat_idx = np.floor((lat + 90.0) / 180.0 * (1 << int(lat_bits)))
+    lon_idx = np.clip(lon_idx, 0, (1 << int(lon_bits)) - 1).astype(np.uint64)
+    lat_idx = np.clip(lat_idx, 0, (1 << int(lat_bits)) - 1).astype(np.uint64)
+
+    return from_xy(lon_idx, lat_idx, precision)
+
+
+def encode(lat, lon, precision=6):
+    """Geohash strings for arrays of latitude/longitude."""
+    return to_str(encode_int(lat, lon, precision), precision)
+
+
+def to_str(codes, precision=6):
+    """Geohash strings for integer codes (``precision`` may be an array)."""
+    codes = np.asarray(codes, dtype=np.uint64).ravel()
+    precision = np.broadcast_to(np.asarray(precision, dtype=np.int64), codes.shape)
+    width = int(np.max(precision, initial=1))
+    pos = np.arange(width, dtype=np.int64)
+    # Geser ke kanan sesuai sisa karakter; posisi di luar presisi dibuat kosong
+    shift = (precision[:, None] - 1 - pos) * 5
+    valid = shift >= 0
+    idx = (codes[:, None] >> np.where(valid, shift, 0).astype(np.uint64)) & np.uint64(31)
+    chars = np.where(valid, _ALPHABET[idx.astype(np.intp)], 0).astype(np.uint32)
+    return np.ascontiguousarray(chars).view(f"<U{width}").ravel()
+
+
+def to_int(geohashes):
+    """Integer codes and precisions for an array of geohash strings."""
+    arr = np.asarray(geohashes, dtype=str)
+    # Cast ke <U12 memotong diam-diam; string lebih panjang ditolak dulu
+    if arr.dtype.itemsize > 4 * MAX_PRECISION and np.any(np.char.str_len(arr) > MAX_PRECISION):
+        raise ValueError(f"geohash longer than {MAX_PRECISION} characters")
+    arr = arr.astype(f"<U{MAX_PRECISION}", copy=False)
+    if arr.ndim == 0:
+        arr = arr.reshape(1)
+    points = np.ascontiguousarray(arr).view(np.uint32).reshape(len(arr), MAX_PRECISION)
+    present = points != 0
+    precision = present.sum(axis=1)
+    if np.any(points >= 128):
+        raise ValueError("Invalid geohash character")
+    values = _LOOKUP[points]
+    if np.any((values == 255) & present):
+        raise ValueError("Invalid geohash character")
+
+    codes = np.zeros(len(arr), dtype=np.uint64)
+    for i in range(MAX_PRECISION):
+        step = present[:, i]
+        codes = np.where(step, (codes << np.uint64(5)) | values[:, i].astype(np.uint64), codes)
+    return codes, precision
+
+
+def bounds_int(codes, precision=6):
+    """Cell bounds ``(minx, miny, maxx, maxy)`` as an ``(N, 4)`` array."""
+    codes = np.asarray(codes, dtype=np.uint64).ravel()
+    precision = np.broadcast_to(np.asarray(precision, dtype=np.int64), codes.shape)
+    lon_bits, lat_bits = _bit_split(precision)
+    x, y = to_xy(codes, precision)
+    lon_idx = x.astype(np.float64)
+    lat_idx = y.astype(np.float64)
+    dlon = 360.0 / np.exp2(lon_bits)
+    dlat = 180.0 / np.exp2(lat_bits)
+
+    minx = lon_idx * dlon - 180.0
+    miny = lat_idx * dlat - 90.0
+    return np.column_stack([minx, miny, minx + dlon, miny + dlat])
+
+
+def centers_int(codes, precision=6):
+    """Cell centres as ``(lat, lon)`` arrays."""
+    b = bounds_int(codes, precision)
+    return (b[:, 1] + b[:, 3]) / 2.0, (b[:, 0] + b[:, 2]) / 2.0
+
+
+def bounds(geohashes):
+    """Cell bounds ``(minx, miny, maxx, maxy)`` for geohash strings."""
+    codes, precision = to_int(geohashes)
+    return bounds_int(codes, precision)
+
+
+def centers(geohashes):
+    """Cell centres ``(lat, lon)`` for geohash strings."""
+    codes, precision = to_int(geohashes)
+    return centers_int(codes, precision)
+
+
+def boxes(cell_bounds):
+    """Shapely box array from an ``(N, 4)`` bounds array."""
+    cell_bounds = np.asarray(cell_bounds, dtype=np.float64).reshape(-1, 4)
+    return shapely.box(cell_bounds[:, 0], cell_bounds[:, 1], cell_bounds[:, 2], cell_bounds[:, 3])
@@ -0,0 +1,190 @@
+"""Precomputed geohash covers for every region of an admin boundary file.
+
+Covers are stored per boundary file as three files: ``names.json`` (region
+names in store order), ``offsets.npy`` and ``codes.npy`` (all integer codes
+concatenated).  The store directory name carries a hash of the boundary file,
+so a changed file is detected and rebuilt automatically on the next open.
+
+Build everything ahead of time (regions are polyfilled on a process pool) with::
+
+    python -m karta.cover_store [--workers N]
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from karta import codec
+from karta.geohash_set import GeohashSet
+from karta.polyfill import geometry_from_geojson, polyfill_many
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_STORE_DIR = ROOT / "data" / "covers"
+
+# Berkas batas admin bawaan dan kolom nama wilayahnya
+BOUNDARY_SOURCES = [
+    (ROOT / "pages" / "batas_admin_kabupaten.geojson", "WADMKK"),
+    (ROOT / "pages" / "batas_admin_provinsi.geojson", "PROVINSI"),
+]
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Short SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def install_dir(tmp, path, attempts=8):
+    """Move the finished directory ``tmp`` to ``path``, replacing any store already there.
+
+    ``os.replace`` cannot overwrite a non-empty directory, so the existing
+    store is first moved into a unique directory next to ``path`` and
+    deleted afterwards.  If another process installs its own store in
+    between, that one is moved aside too and the move retried.
+    """
+    path = Path(path)
+    aside = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".old_{path.name}_"))
+    try:
+        for attempt in range(attempts):
+            try:
+                os.replace(path, aside / str(attempt))
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(tmp, path)
+                return path
+            except OSError as e:
+                # Proses lain memasang store di antara dua rename: pindahkan lagi lalu ulangi
+                if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                    raise
+        raise OSError(errno.EBUSY, f"Could not install {path}: replaced concurrently {attempts} times")
+    finally:
+        shutil.rmtree(aside, ignore_errors=True)
+
+
+def _store_prefix(boundary_path, field, precision):
+    return f"{Path(boundary_path).stem}_{field}_p{precision}_"
+
+
+def group_features(geojson_data, field):
+    """Features of a FeatureCollection grouped by the ``field`` property."""
+    groups = {}
+    for feature in geojson_data["features"]:
+        name = feature["properties"].get(field)
+        if name:
+            groups.setdefault(name, []).append(feature)
+    return groups
+
+
+def compute_covers(geojson_data, field, precision=6, workers=None):
+    """``{name: codes}`` cover of every region in a boundary FeatureCollection.
+
+    Regions are polyfilled on a process pool of ``workers`` (default: all
+    cores); large regions are split into tiles so they use several cores too.
+    """
+    groups = sorted(group_features(geojson_data, field).items())
+    geoms = [
+        geometry_from_geojson({"type": "FeatureCollection", "features": features})
+        for _, features in groups
+    ]
+    codes = polyfill_many(geoms, precision, workers)
+    return {name: region_codes for (name, _), region_codes in zip(groups, codes)}
+
+
+def write_store(covers, path):
+    """Write ``{name: codes}`` covers atomically to the store directory ``path``."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    names = list(covers)
+    sizes = [len(covers[name]) for name in names]
+    offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]).astype(np.int64)
+    codes = (np.concatenate([covers[name] for name in names]) if names
+             else np.empty(0, dtype=np.uint64)).astype(np.uint64)
+
+    tmp = Path(tempfile.mkdtemp(dir=path.parent, prefix=".tmp_"))
+    try:
+        with open(tmp / "names.json", "w", encoding="utf-8") as f:
+            json.dump(names, f, ensure_ascii=False)
+        np.save(tmp / "offsets.npy", offsets)
+        np.save(tmp / "codes.npy", codes)
+        install_dir(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+class CoverStore:
+    """Read-only view over a built cover store; codes are memory-mapped."""
+
+    def __init__(self, path, precision=6):
+        self.path = Path(path)
+        self.precision = precision
+        with open(self.path / "names.json", encoding="utf-8") as f:
+            self.names = json.load(f)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._offsets = np.load(self.path / "offsets.npy")
+        self._codes = np.load(self.path / "codes.npy", mmap_mode="r")
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def codes(self, name):
+        """Sorted integer codes covering region ``name`` (empty if unknown)."""
+        i = self._index.get(name)
+        if i is None:
+            return np.empty(0, dtype=np.uint64)
+        return np.asarray(self._codes[self._offsets[i]:self._offsets[i + 1]])
+
+    def geohash_set(self, name):
+        """Cover of region ``name`` as a :class:`GeohashSet`."""
+        return GeohashSet(self.codes(name), self.precision)
+
+    def geohashes(self, name):
+        """Geohash strings covering region ``name``."""
+        return codec.to_str(self.codes(name), self.precision).tolist()
+
+
+def build_store(boundary_path, field, precision=6, store_dir=DEFAULT_STORE_DIR, workers=None):
+    """(Re)build the store for a boundary file and remove stale versions of it."""
+    with open(boundary_path, "r", encoding="utf-8") as f:
+        geojson_data = json.load(f)
+    covers = compute_covers(geojson_data, field, precision, workers)
+
+    prefix = _store_prefix(boundary_path, field, precision)
+    path = Path(store_dir) / f"{prefix}{file_hash(boundary_path)}"
+    write_store(covers, path)
+
+    for old in Path(store_dir).glob(f"{prefix}*"):
+        if old != path and old.is_dir():
+            shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def open_store(boundary_path, field, precision=6, store_dir=DEFAULT_STORE_DIR, workers=None):
+    """Open the store matching the current boundary file, building it if needed."""
+    prefix = _store_prefix(boundary_path, field, precision)
+    path = Path(store_dir) / f"{prefix}{file_hash(boundary_path)}"
+    if not (path / "codes.npy").exists():
+        path = build_store(boundary_path, field, precision, store_dir, workers)
+    return CoverStore(path, precision)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute geohash covers for the bundled admin boundaries.")
+    parser.add_argument("--precision", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=None, help="process count (default: all cores)")
+    args = parser.parse_args()
+
+    for boundary_path, field in BOUNDARY_SOURCES:
+        path = build_store(boundary_path, field, args.precision, workers=args.workers)
+        print(f"{boundary_path.name} [{field}] -> {path}")
@@ -0,0 +1,116 @@
+"""Per-geohash feature density for the Select Dense Geohash page."""
+import numpy as np
+import pandas as pd
+import shapely
+
+from karta import codec
+from karta.clusters import label_clusters, select_clusters
+from karta.neighbors import fill_holes, is_member
+
+
+def representative_codes(geometries, precision=6):
+    """Integer geohash of a representative point per geometry, in one pass.
+
+    Returns ``(codes, mask)`` where ``mask`` marks the input geometries that
+    got a code; missing, empty or unrepairable geometries are masked out.
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    usable = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+
+    # Geometri invalid diperbaiki dulu (vektor) daripada ditangkap lewat exception
+    invalid = usable & ~shapely.is_valid(geoms)
+    if invalid.any():
+        geoms = geoms.copy()
+        geoms[invalid] = shapely.make_valid(geoms[invalid])
+
+    points = np.full(len(geoms), None, dtype=object)
+    points[usable] = shapely.point_on_surface(geoms[usable])
+    x = shapely.get_x(points)
+    y = shapely.get_y(points)
+    mask = usable & ~(np.isnan(x) | np.isnan(y))
+    return codec.encode_int(y[mask], x[mask], precision), mask
+
+
+ROAD_CLASSES = ("motorway", "trunk", "primary", "secondary")
+
+
+def _poi_layers(poi, tags):
+    # Tiap POI dihitung sekali, pada tag pertama (urutan ``tags``) yang dimilikinya
+    conditions = [poi[tag].notna().to_numpy() for tag in tags if tag in poi.columns]
+    choices = [f"poi:{tag}" for tag in tags if tag in poi.columns]
+    return np.select(conditions, choices, default="poi:other")
+
+
+def _road_layers(roads):
+    if "highway" not in roads.columns:
+        return np.full(len(roads), "road:other", dtype=object)
+    return ("road:" + roads["highway"].astype(str)).to_numpy()
+
+
+def raw_counts(poi, roads, tags, precision=6):
+    """Raw feature counts per geohash, one column per tag and road class.
+
+    Rows are indexed by integer geohash ``code``; columns are ``poi:<tag>``
+    and ``road:<highway>``. Every feature lands in exactly one column, so a
+    row sum is the plain feature count of the cell.
+    """
+    codes, layers = [], []
+    for gdf, label in ((poi, lambda g: _poi_layers(g, tags)), (roads, _road_layers)):
+        if len(gdf) == 0:
+            continue
+        gdf_codes, mask = representative_codes(gdf.geometry.values, precision)
+        codes.append(gdf_codes)
+        layers.append(np.asarray(label(gdf), dtype=object)[mask])
+    if not codes:
+        return pd.DataFrame(index=pd.Index(np.empty(0, dtype=np.uint64), name="code"))
+
+    table = (
+        pd.DataFrame({"code": np.concatenate(codes), "layer": np.concatenate(layers)})
+        .groupby(["code", "layer"]).size()
+        .unstack(fill_value=0)
+    )
+    order = [f"poi:{tag}" for tag in tags] + ["poi:other"] + [f"road:{c}" for c in ROAD_CLASSES]
+    columns = [c for c in order if c in table.columns]
+    return table[columns + sorted(set(table.columns) - set(columns))]
+
+
+def density_scores(table, weights=None):
+    """Weighted row sums of a :func:`raw_counts` table; unlisted columns weigh 1."""
+    weights = weights or {}
+    w = np.array([weights.get(column, 1.0) for column in table.columns], dtype=float)
+    return table.to_numpy(dtype=float) @ w
+
+
+def select_dense(codes, scores, precision=6, top_percent=0.5, min_neighbors=2,
+                 connectivity=8, top_clusters=1, min_cluster_size=None):
+    """Dense-cell selection on a count table, without touching any geometry.
+
+    Cells scoring in the ``top_percent`` quantile are kept, holes surrounded
+    by ``min_neighbors`` dense cells are filled back in (``None`` disables
+    it) and only the largest ``top_clusters`` clusters are retained.
+    Returns ``(mask, labels)`` aligned with ``codes``; unselected cells get
+    label -1.
+    """
+    codes = np.asarray(codes, dtype=np.uint64)
+    scores = np.asarray(scores, dtype=float)
+    labels = np.full(len(codes), -1, dtype=np.int64)
+    candidate = scores > 0
+    if not candidate.any():
+        return np.zeros(len(codes), dtype=bool), labels
+
+    threshold = np.quantile(scores[candidate], 1 - top_percent)
+    dense = candidate & (scores >= threshold)
+
+    if min_neighbors:
+        # Sel di bawah ambang yang dikelilingi >= min_neighbors sel padat ikut dipilih
+        missing = fill_holes(codes[dense], precision, min_neighbors, connectivity)
+        dense |= candidate & is_member(codes, missing)
+
+    # Cluster dari ketetanggaan sel (union-find), buang outlier yang jauh
+    dense_labels = label_clusters(codes[dense], precision, connectivity)
+    keep = select_clusters(dense_labels, top_n=top_clusters, min_size=min_cluster_size)
+    idx = np.flatnonzero(dense)[keep]
+    labels[idx] = dense_labels[keep]
+    mask = np.zeros(len(codes), dtype=bool)
+    mask[idx] = True
+    return mask, labels
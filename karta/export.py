@@ -0,0 +1,138 @@
+"""Streaming GeoJSON export of geohash covers.
+
+Features are written straight from vectorized cell bounds in fixed-size
+chunks, without building Shapely polygons or per-feature dicts, so memory
+stays bounded by one chunk plus the output buffer.
+"""
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from karta import codec
+
+CHUNK_SIZE = 20_000
+
+_HEADER = b'{"type":"FeatureCollection","features":['
+_FOOTER = b']}'
+_FEATURE = (
+    '{{"type":"Feature","geometry":{{"type":"Polygon","coordinates":'
+    '[[[{0},{1}],[{2},{1}],[{2},{3}],[{0},{3}],[{0},{1}]]]}},'
+    '"properties":{{"{4}":"{5}"}}}}'
+)
+_CELL_FEATURE = (
+    '{{"type":"Feature","geometry":{{"type":"Polygon","coordinates":'
+    '[[[{0},{1}],[{2},{1}],[{2},{3}],[{0},{3}],[{0},{1}]]]}},'
+    '"properties":{4}}}'
+)
+
+
+def iter_geojson(codes, precision=6, name_field="Name", chunk_size=CHUNK_SIZE):
+    """Yield compact FeatureCollection bytes for integer geohash ``codes``.
+
+    ``precision`` may be a per-cell array for mixed-precision (compacted) covers.
+    """
+    codes = np.asarray(codes, dtype=np.uint64)
+    precision = np.broadcast_to(np.asarray(precision, dtype=np.int64), codes.shape)
+    yield _HEADER
+    for start in range(0, len(codes), chunk_size):
+        chunk = codes[start:start + chunk_size]
+        chunk_precision = precision[start:start + chunk_size]
+        names = codec.to_str(chunk, chunk_precision).tolist()
+        cell_bounds = codec.bounds_int(chunk, chunk_precision)
+        # Sel bertetangga berbagi koordinat: format tiap nilai unik sekali saja
+        values, index = np.unique(cell_bounds, return_inverse=True)
+        text = [repr(v) for v in values.tolist()]
+        body = ",".join(
+            _FEATURE.format(text[w], text[s], text[e], text[n], name_field, gh)
+            for (w, s, e, n), gh in zip(index.reshape(-1, 4).tolist(), names)
+        )
+        yield (b"," if start else b"") + body.encode("ascii")
+    yield _FOOTER
+
+
+def iter_features(frames):
+    """Yield compact FeatureCollection bytes for an iterable of GeoDataFrame chunks.
+
+    Non-geometry columns become feature properties; each chunk is encoded
+    with one vectorized ``to_geojson`` and one ``to_json`` call.
+    """
+    yield _HEADER
+    first = True
+    for gdf in frames:
+        if gdf.empty:
+            continue
+        geometries = shapely.to_geojson(np.asarray(gdf.geometry.values)).tolist()
+        attributes = gdf.drop(columns=gdf.geometry.name)
+        # Tanpa kolom atribut to_json tidak menghasilkan baris; properties tetap objek kosong
+        properties = (attributes.to_json(orient="records", lines=True, date_format="iso").splitlines()
+                      if len(attributes.columns) else ["{}"] * len(geometries))
+        if len(properties) != len(geometries):
+            raise ValueError(f"{len(properties)} property records for {len(geometries)} geometries")
+        body = ",".join(
+            f'{{"type":"Feature","geometry":{geometry or "null"},"properties":{props}}}'
+            for geometry, props in zip(geometries, properties)
+        )
+        yield (b"" if first else b",") + body.encode("utf-8")
+        first = False
+    yield _FOOTER
+
+
+def iter_cell_features(frames, column, chunk_size=CHUNK_SIZE):
+    """Yield compact FeatureCollection bytes of cell polygons for DataFrame chunks.
+
+    Each row becomes the polygon of the geohash in ``column``, decoded
+    vectorially per chunk; all columns are kept as feature properties.
+    Frames are encoded ``chunk_size`` rows at a time to bound the text buffers.
+    """
+    yield _HEADER
+    first = True
+    for frame in frames:
+        for start in range(0, len(frame), chunk_size):
+            df = frame.iloc[start:start + chunk_size]
+            cell_bounds = codec.bounds(df[column].astype(str).to_numpy())
+            values, index = np.unique(cell_bounds, return_inverse=True)
+            text = [repr(v) for v in values.tolist()]
+            properties = df.to_json(orient="records", lines=True, date_format="iso").splitlines()
+            body = ",".join(
+                _CELL_FEATURE.format(text[w], text[s], text[e], text[n], props)
+                for (w, s, e, n), props in zip(index.reshape(-1, 4).tolist(), properties)
+            )
+            yield (b"" if first else b",") + body.encode("utf-8")
+            first = False
+    yield _FOOTER
+
+
+def write_geojson(fileobj, codes, precision=6, name_field="Name", chunk_size=CHUNK_SIZE):
+    """Stream the FeatureCollection for ``codes`` into a binary file object."""
+    for part in iter_geojson(codes, precision, name_field, chunk_size):
+        fileobj.write(part)
+
+
+def geojson_buffer(codes, precision=6, name_field="Name"):
+    """In-memory buffer holding the FeatureCollection, rewound for reading."""
+    buffer = BytesIO()
+    write_geojson(buffer, codes, precision, name_field)
+    buffer.seek(0)
+    return buffer
+
+
+def download_bytes(spooled):
+    """Whole content of a (spooled) file as bytes for ``st.download_button``.
+
+    Streamlit holds a download's payload in memory in any case, so the
+    spooling only bounds memory while the output is being written, not
+    once it is offered for download.
+    """
+    spooled.seek(0)
+    return spooled.read()
+
+
+def geohash_csv(codes, precision=6):
+    """CSV text with geohash, cell centre lat/lon (and precision when mixed)."""
+    lat, lon = codec.centers_int(codes, precision)
+    df = pd.DataFrame({"geohash": codec.to_str(codes, precision), "lat": lat, "lon": lon})
+    if np.ndim(precision) > 0:
+        df.insert(1, "precision", precision)
+    return df.to_csv(index=False)
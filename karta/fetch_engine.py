@@ -0,0 +1,92 @@
+"""Concurrent download jobs with a shared rate limit and retries.
+
+Jobs run on a bounded thread pool.  Every attempt waits for a slot from a
+shared :class:`RateLimiter`, and failed attempts are retried with
+exponential backoff.  Results are yielded in the calling thread as jobs
+finish, so callers can store them and drive a progress bar (Streamlit
+elements must be updated from the script thread) without extra locking.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+WORKERS = 2
+RATE = 1.0  # query per detik; Overpass publik membatasi slot per IP
+RETRIES = 3
+BACKOFF = 2.0
+
+
+class RateLimiter:
+    """At most ``rate`` acquisitions per second, shared by all threads."""
+
+    def __init__(self, rate=RATE):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class FetchReport:
+    """Outcome per job key: ``succeeded`` keys and ``failed`` key -> error message."""
+
+    def __init__(self):
+        self.succeeded = []
+        self.failed = {}
+
+
+class FetchError(RuntimeError):
+    """Some jobs still failed after all retries; ``report`` has the details."""
+
+    def __init__(self, report):
+        key, message = next(iter(report.failed.items()))
+        super().__init__(f"{len(report.failed)} download(s) failed, e.g. {key}: {message}")
+        self.report = report
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(key, rate=RATE):
+    """Process-wide :class:`RateLimiter` for ``key`` (e.g. an API endpoint).
+
+    Every caller with the same key shares one budget, whatever page or
+    session it comes from.  ``rate`` only applies when the limiter is
+    created, so no caller can change the budget of the others.
+    """
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(rate)
+        return _limiters[key]
+
+
+def _attempt(fn, job, limiter, retries, backoff):
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return fn(job)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def run_jobs(jobs, fn, workers=WORKERS, rate=RATE, retries=RETRIES, backoff=BACKOFF, limiter=None):
+    """Run ``fn(job)`` for every job; yield ``(job, result, error)`` as each finishes.
+
+    ``error`` is None on success, otherwise the exception of the last attempt
+    (and ``result`` is None).
+    """
+    limiter = limiter or RateLimiter(rate)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_attempt, fn, job, limiter, retries, backoff): job for job in jobs}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], None if error else future.result(), error
@@ -0,0 +1,74 @@
+"""Plan a few large Overpass queries for many geohash cells, then clip locally.
+
+Instead of one request per cell, cells are grouped into covering query
+boxes: first by contiguous cluster, then, when a cluster's bounding box
+exceeds ``max_area`` (square degrees), by ever finer geohash prefix.  Each
+box is fetched once and the result is cut back into the individual cells
+with one vectorized intersection.
+"""
+import numpy as np
+import shapely
+
+from karta import codec
+from karta.clusters import label_clusters
+
+# ~25 x 25 km di khatulistiwa; cukup besar untuk satu kota, tetap ringan untuk Overpass
+MAX_QUERY_AREA = 0.05
+
+
+def _bbox(cell_bounds):
+    return (cell_bounds[:, 0].min(), cell_bounds[:, 1].min(),
+            cell_bounds[:, 2].max(), cell_bounds[:, 3].max())
+
+
+def _area(bbox):
+    return (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+
+
+def _split(codes, cell_bounds, idx, precision, level, max_area):
+    bbox = _bbox(cell_bounds[idx])
+    if _area(bbox) <= max_area or len(idx) == 1 or level >= precision:
+        yield bbox, idx
+        return
+    prefix = codes[idx] >> np.uint64(5 * (precision - level - 1))
+    _, inverse = np.unique(prefix, return_inverse=True)
+    for group in range(inverse.max() + 1):
+        yield from _split(codes, cell_bounds, idx[inverse == group], precision, level + 1, max_area)
+
+
+def plan_boxes(codes, precision=6, max_area=MAX_QUERY_AREA):
+    """Query boxes covering ``codes``: list of ``(bbox, member_index)``.
+
+    ``bbox`` is ``(minx, miny, maxx, maxy)``; ``member_index`` holds the
+    positions in ``codes`` of the cells the box serves.  Every cell is in
+    exactly one box.
+    """
+    codes = np.asarray(codes, dtype=np.uint64)
+    if len(codes) == 0:
+        return []
+    cell_bounds = codec.bounds_int(codes, precision)
+    labels = label_clusters(codes, precision)
+    plan = []
+    for cluster in range(labels.max() + 1):
+        plan.extend(_split(codes, cell_bounds, np.flatnonzero(labels == cluster), precision, 0, max_area))
+    return plan
+
+
+def clip_to_cells(gdf, codes, precision=6):
+    """Cut features into the cells they cross; one row per (cell, feature) piece.
+
+    Adds a ``geoHash`` column and keeps the feature's other columns.
+    """
+    codes = np.asarray(codes, dtype=np.uint64)
+    if gdf.empty or len(codes) == 0:
+        return gdf.iloc[:0].assign(geoHash=[])
+    cells = shapely.box(*codec.bounds_int(codes, precision).T)
+    geoms = np.asarray(gdf.geometry.values)
+    cell_idx, feat_idx = shapely.STRtree(geoms).query(cells, predicate="intersects")
+    pieces = shapely.intersection(geoms[feat_idx], cells[cell_idx])
+    keep = ~shapely.is_empty(pieces)
+
+    out = gdf.iloc[feat_idx[keep]].reset_index(drop=True)
+    out = out.set_geometry(pieces[keep], crs=gdf.crs)
+    out.insert(0, "geoHash", codec.to_str(codes[cell_idx[keep]], precision))
+    return out
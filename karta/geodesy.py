@@ -0,0 +1,57 @@
+"""Vectorized geodesic length of lon/lat line geometries.
+
+All vertices are pulled out in one ``shapely.get_coordinates`` call (after
+splitting multi-part geometries with ``get_parts``) and every segment is
+measured on the WGS84 ellipsoid using the meridional and prime-vertical
+radii of curvature at the segment's mid-latitude.  Road segments are tens
+to hundreds of metres long, where this agrees with a full geodesic
+inverse to well below a millimetre per kilometre, without reprojecting
+or copying any geometry.  Per-geometry and per-group totals are reduced
+with ``bincount`` over the segment offsets.
+"""
+import numpy as np
+import shapely
+
+# Elipsoid WGS84
+WGS84_A = 6_378_137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+
+def segment_lengths(geoms):
+    """Length in metres of every segment, with the index of its geometry.
+
+    Returns ``(lengths, geom_index)``.  Segments never span two parts of a
+    multi-part geometry; points and empty geometries have no segments.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    parts, geom_index = shapely.get_parts(geoms, return_index=True)
+    coords, part_index = shapely.get_coordinates(parts, return_index=True)
+    if len(coords) < 2:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+
+    same_part = part_index[1:] == part_index[:-1]
+    lon = np.radians(coords[:, 0])
+    lat = np.radians(coords[:, 1])
+    dlon = (lon[1:] - lon[:-1])[same_part]
+    dlat = (lat[1:] - lat[:-1])[same_part]
+    mid = ((lat[1:] + lat[:-1]) / 2)[same_part]
+
+    w2 = 1 - WGS84_E2 * np.sin(mid) ** 2
+    meridional = WGS84_A * (1 - WGS84_E2) / w2 ** 1.5
+    prime_vertical = WGS84_A / np.sqrt(w2)
+    lengths = np.hypot(meridional * dlat, prime_vertical * np.cos(mid) * dlon)
+    return lengths, geom_index[part_index[:-1][same_part]]
+
+
+def geodesic_length(geoms):
+    """Length in metres of each geometry in ``geoms`` (lon/lat, EPSG:4326)."""
+    geoms = np.asarray(geoms, dtype=object)
+    lengths, geom_index = segment_lengths(geoms)
+    return np.bincount(geom_index, weights=lengths, minlength=len(geoms))
+
+
+def length_by(geoms, keys):
+    """Total length in metres per distinct key: returns ``(keys, lengths)``."""
+    uniq, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    return uniq, np.bincount(inverse.ravel(), weights=geodesic_length(geoms), minlength=len(uniq))
@@ -0,0 +1,228 @@
+"""Compact geohash set backed by a sorted ``uint64`` NumPy array.
+
+Every member is stored as its integer code at one shared precision, so set
+algebra, membership and serialization are vectorized array operations and
+no Python string is created until one is asked for.
+"""
+import io
+import struct
+
+import numpy as np
+
+from karta import codec
+
+
+def _as_codes(values):
+    """Sorted, de-duplicated ``uint64`` copy of ``values``."""
+    values = np.sort(np.asarray(values, dtype=np.uint64).ravel())
+    if len(values) > 1:
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+def compact(codes, precision=6, min_precision=1):
+    """Merge every complete group of 32 siblings into its parent, level by level.
+
+    Returns ``(codes, precisions)``: a mixed-precision cover of exactly the same
+    area, sorted by code within each precision from fine to coarse.
+    """
+    level_codes = _as_codes(codes)
+    out_codes, out_precisions = [], []
+    for level in range(precision, min_precision, -1):
+        if len(level_codes) < 32:
+            break
+        parents = level_codes >> np.uint64(5)
+        # Kode terurut: saudara satu induk selalu bersebelahan
+        starts = np.flatnonzero(np.concatenate(([True], parents[1:] != parents[:-1])))
+        sizes = np.diff(np.append(starts, len(parents)))
+        full = np.repeat(sizes == 32, sizes)
+        out_codes.append(level_codes[~full])
+        out_precisions.append(np.full(np.count_nonzero(~full), level, dtype=np.int64))
+        level_codes = parents[starts[sizes == 32]]
+        precision = level - 1
+    out_codes.append(level_codes)
+    out_precisions.append(np.full(len(level_codes), precision, dtype=np.int64))
+    return np.concatenate(out_codes), np.concatenate(out_precisions)
+
+
+def expand(codes, precisions, precision=6):
+    """Inverse of :func:`compact`: uniform, sorted codes at ``precision``."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    precisions = np.broadcast_to(np.asarray(precisions, dtype=np.int64), codes.shape)
+    if np.any(precisions > precision):
+        raise ValueError("Cannot expand cells finer than the target precision")
+    parts = []
+    for level in np.unique(precisions):
+        levels = int(precision - level)
+        offsets = np.arange(32 ** levels, dtype=np.uint64)
+        parts.append(((codes[precisions == level, None] << np.uint64(5 * levels)) | offsets).ravel())
+    return _as_codes(np.concatenate(parts)) if parts else np.empty(0, dtype=np.uint64)
+
+
+class GeohashSet:
+    """Set of geohash cells at a single precision."""
+
+    __slots__ = ("codes", "precision")
+
+    def __init__(self, codes=(), precision=6):
+        if not 1 <= precision <= codec.MAX_PRECISION:
+            raise ValueError(f"precision must be between 1 and {codec.MAX_PRECISION}")
+        self.codes = _as_codes(codes)
+        self.precision = precision
+
+    @classmethod
+    def _from_sorted(cls, codes, precision):
+        obj = cls.__new__(cls)
+        obj.codes = codes
+        obj.precision = precision
+        return obj
+
+    @classmethod
+    def from_geohashes(cls, geohashes, precision=None):
+        """Build a set from geohash strings (all of the same length)."""
+        codes, lengths = codec.to_int(list(geohashes))
+        if len(codes) == 0:
+            return cls((), precision or 6)
+        if np.any(lengths != lengths[0]):
+            raise ValueError("All geohashes must have the same precision")
+        if precision is not None and lengths[0] != precision:
+            raise ValueError(f"Expected geohash{precision}, got geohash{lengths[0]}")
+        return cls(codes, int(lengths[0]))
+
+    # --- protocol --------------------------------------------------------
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return iter(self.to_geohashes())
+
+    def __repr__(self):
+        return f"GeohashSet({len(self)} cells, precision={self.precision})"
+
+    def __eq__(self, other):
+        if not isinstance(other, GeohashSet):
+            return NotImplemented
+        return self.precision == other.precision and np.array_equal(self.codes, other.codes)
+
+    def __contains__(self, item):
+        if isinstance(item, str):
+            if len(item) != self.precision:
+                return False
+            item = codec.to_int([item])[0][0]
+        return bool(self.contains(np.array([item], dtype=np.uint64))[0])
+
+    def contains(self, codes):
+        """Boolean mask: which of ``codes`` are members."""
+        codes = np.asarray(codes, dtype=np.uint64)
+        if len(self.codes) == 0:
+            return np.zeros(codes.shape, dtype=bool)
+        idx = np.searchsorted(self.codes, codes)
+        idx = np.minimum(idx, len(self.codes) - 1)
+        return self.codes[idx] == codes
+
+    # --- set algebra -----------------------------------------------------
+
+    def _check(self, other):
+        if not isinstance(other, GeohashSet):
+            raise TypeError("GeohashSet operations need another GeohashSet")
+        if other.precision != self.precision:
+            raise ValueError(
+                f"Precision mismatch ({self.precision} vs {other.precision}); "
+                "use to_precision() first"
+            )
+
+    def union(self, other):
+        self._check(other)
+        return self._from_sorted(_as_codes(np.concatenate([self.codes, other.codes])), self.precision)
+
+    def intersection(self, other):
+        self._check(other)
+        return self._from_sorted(
+            np.intersect1d(self.codes, other.codes, assume_unique=True), self.precision
+        )
+
+    def difference(self, other):
+        self._check(other)
+        return self._from_sorted(self.codes[~other.contains(self.codes)], self.precision)
+
+    def symmetric_difference(self, other):
+        self._check(other)
+        return self._from_sorted(
+            np.setxor1d(self.codes, other.codes, assume_unique=True), self.precision
+        )
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
+
+    # --- conversion ------------------------------------------------------
+
+    def to_geohashes(self):
+        """Members as a list of geohash strings."""
+        return codec.to_str(self.codes, self.precision).tolist()
+
+    def to_precision(self, precision):
+        """Same area at another precision (parents when coarser, children when finer)."""
+        if precision == self.precision:
+            return self
+        if precision < self.precision:
+            shift = np.uint64(5 * (self.precision - precision))
+            return GeohashSet(self.codes >> shift, precision)
+        levels = precision - self.precision
+        offsets = np.arange(32 ** levels, dtype=np.uint64)
+        children = (self.codes[:, None] << np.uint64(5 * levels)) | offsets
+        return self._from_sorted(children.ravel(), precision)
+
+    def compact(self, min_precision=1):
+        """Mixed-precision ``(codes, precisions)`` form, see :func:`compact`."""
+        return compact(self.codes, self.precision, min_precision)
+
+    @classmethod
+    def from_compact(cls, codes, precisions, precision=6):
+        return cls._from_sorted(expand(codes, precisions, precision), precision)
+
+    def bounds(self):
+        """``(N, 4)`` array of member cell bounds."""
+        return codec.bounds_int(self.codes, self.precision)
+
+    # --- serialization ---------------------------------------------------
+
+    _HEADER = struct.Struct("<4sBQ")
+    _MAGIC = b"GHS1"
+
+    def to_bytes(self):
+        """Precision, count and delta-encoded codes as bytes (zlib-friendly)."""
+        deltas = np.diff(self.codes, prepend=np.uint64(0))
+        return (self._HEADER.pack(self._MAGIC, self.precision, len(self.codes))
+                + deltas.astype("<u8").tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, precision, count = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC:
+            raise ValueError("Not a GeohashSet payload")
+        deltas = np.frombuffer(data, dtype="<u8", count=count, offset=cls._HEADER.size)
+        return cls._from_sorted(np.cumsum(deltas, dtype=np.uint64), precision)
+
+    def save(self, path):
+        """Write the set to ``path`` as a compressed ``.npz``."""
+        np.savez_compressed(
+            path,
+            deltas=np.diff(self.codes, prepend=np.uint64(0)),
+            precision=np.array(self.precision),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            codes = np.cumsum(data["deltas"], dtype=np.uint64)
+            return cls._from_sorted(codes, int(data["precision"]))
+
+    def to_buffer(self):
+        """The :meth:`save` payload as an in-memory buffer (for downloads)."""
+        buffer = io.BytesIO()
+        self.save(buffer)
+        buffer.seek(0)
+        return buffer
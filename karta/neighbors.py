@@ -0,0 +1,92 @@
+"""Neighbour, k-ring and ring queries on integer geohash arrays.
+
+Cells are moved on the (column, row) grid with plain integer arithmetic:
+columns wrap around the antimeridian, rows past a pole are dropped.
+Membership tests use sorted arrays (``searchsorted``), so every function is
+O(n log n) in the number of cells, never O(n^2).
+"""
+import numpy as np
+
+from karta import codec
+
+# Offset (dx, dy) tetangga: 4-konektivitas lalu diagonal untuk 8-konektivitas
+_OFFSETS_4 = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+_OFFSETS_8 = _OFFSETS_4 + [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+
+
+def _offsets(connectivity):
+    if connectivity == 4:
+        return _OFFSETS_4
+    if connectivity == 8:
+        return _OFFSETS_8
+    raise ValueError("connectivity must be 4 or 8")
+
+
+def _shift(x, y, offsets, precision):
+    """Codes of ``(x, y)`` moved by each offset: ``(N, len(offsets))`` plus a validity mask."""
+    ncol, nrow = codec.grid_shape(precision)
+    dx = np.array([o[0] for o in offsets], dtype=np.int64)
+    dy = np.array([o[1] for o in offsets], dtype=np.int64)
+    nx = (x.astype(np.int64)[:, None] + dx) % ncol
+    ny = y.astype(np.int64)[:, None] + dy
+    valid = (ny >= 0) & (ny < nrow)
+    codes = codec.from_xy(nx, np.clip(ny, 0, nrow - 1), precision)
+    return codes, valid
+
+
+def is_member(codes, sorted_set):
+    """Boolean mask: which ``codes`` are in the sorted array ``sorted_set``."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    if len(sorted_set) == 0:
+        return np.zeros(codes.shape, dtype=bool)
+    idx = np.minimum(np.searchsorted(sorted_set, codes), len(sorted_set) - 1)
+    return sorted_set[idx] == codes
+
+
+def neighbors(codes, precision=6, connectivity=8):
+    """``(N, 4|8)`` neighbour codes and a mask of which exist (false past the poles)."""
+    x, y = codec.to_xy(np.asarray(codes, dtype=np.uint64), precision)
+    return _shift(x, y, _offsets(connectivity), precision)
+
+
+def _square(k, hollow=False):
+    r = np.arange(-k, k + 1)
+    dx, dy = np.meshgrid(r, r)
+    keep = (np.maximum(np.abs(dx), np.abs(dy)) == k) if hollow else np.ones_like(dx, dtype=bool)
+    return list(zip(dx[keep].tolist(), dy[keep].tolist()))
+
+
+def k_ring(codes, precision=6, k=1):
+    """Sorted unique cells within ``k`` steps (Chebyshev distance) of any input cell."""
+    x, y = codec.to_xy(np.asarray(codes, dtype=np.uint64), precision)
+    out, valid = _shift(x, y, _square(k), precision)
+    return np.unique(out[valid])
+
+
+def ring(codes, precision=6, k=1):
+    """Sorted unique cells exactly ``k`` steps from some input cell (hollow square)."""
+    if k == 0:
+        return np.unique(np.asarray(codes, dtype=np.uint64))
+    x, y = codec.to_xy(np.asarray(codes, dtype=np.uint64), precision)
+    out, valid = _shift(x, y, _square(k, hollow=True), precision)
+    return np.unique(out[valid])
+
+
+def buffer_cells(codes, precision=6, n=1):
+    """Cover grown outward by ``n`` cells; alias of :func:`k_ring` for clarity."""
+    return k_ring(codes, precision, n)
+
+
+def neighbor_counts(codes, precision=6, connectivity=8):
+    """Cells outside ``codes`` touching it, with how many member neighbours each has."""
+    members = np.unique(np.asarray(codes, dtype=np.uint64))
+    nbs, valid = neighbors(members, precision, connectivity)
+    candidates = nbs[valid]
+    candidates = candidates[~is_member(candidates, members)]
+    return np.unique(candidates, return_counts=True)
+
+
+def fill_holes(codes, precision=6, min_neighbors=2, connectivity=8):
+    """Cells outside ``codes`` surrounded by at least ``min_neighbors`` members."""
+    candidates, counts = neighbor_counts(codes, precision, connectivity)
+    return candidates[counts >= min_neighbors]
@@ -0,0 +1,361 @@
+"""Persistent on-disk cache of Overpass results, split into geohash tiles.
+
+A request (a polygon plus an osmnx-style tag dict) is covered with
+geohash tiles (precision 5 by default, ~5 x 5 km); only tiles that are not
+cached, or older than the TTL, are downloaded, batched into a few query
+boxes by :mod:`karta.fetch_plan`.  Each tile is stored as one Parquet file
+(``osm_type``, ``osm_id``, WKB ``geometry`` and one string column per tag
+key) under a directory named after the tag set, and an SQLite index keeps
+fetch time, last use and size per tile for TTL and size-bounded LRU
+eviction, plus persistent hit/miss counters.
+
+The cache is shared by every page and survives restarts.  Downloads go
+through osmnx; point it at a local stand-in Overpass server with the
+``KARTA_OVERPASS_URL`` environment variable or :func:`set_overpass_url`.
+The query rate per endpoint is a server setting, ``KARTA_OVERPASS_RATE``
+(queries per second), shared by every session.
+
+Inspect or empty the cache with::
+
+    python -m karta.osm_cache [--clear]
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from shapely.geometry import box
+
+from karta import codec
+from karta.cover_store import ROOT
+from karta.fetch_engine import RATE, RETRIES, WORKERS, FetchError, FetchReport, run_jobs, shared_limiter
+from karta.fetch_plan import MAX_QUERY_AREA, plan_boxes
+from karta.osm_local import _empty, _normalize_tags
+from karta.polyfill import polyfill
+
+DEFAULT_CACHE_DIR = ROOT / "data" / "osm_tiles"
+DEFAULT_OVERPASS_URL = "https://overpass-api.de/api"
+TILE_PRECISION = 5
+MAX_BYTES = 2 << 30
+TTL = 30 * 24 * 3600
+
+_INDEX = """
+CREATE TABLE IF NOT EXISTS tiles (
+    tag_key TEXT, tile TEXT, size INTEGER, fetched_at REAL, last_used REAL,
+    PRIMARY KEY (tag_key, tile)
+);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER);
+"""
+
+
+class MissingTilesError(LookupError):
+    """Requested tiles are not in the cache (never fetched, or evicted meanwhile)."""
+
+    def __init__(self, tiles):
+        super().__init__(f"{len(tiles)} tile(s) not cached, e.g. {tiles[0]}")
+        self.tiles = tiles
+
+
+def set_overpass_url(url):
+    """Send osmnx Overpass queries to ``url`` (e.g. a local stand-in server)."""
+    import osmnx as ox
+    # osmnx >= 2 memakai overpass_url, versi 1.x overpass_endpoint
+    ox.settings.overpass_url = url
+    ox.settings.overpass_endpoint = url
+
+
+def overpass_endpoint():
+    """Overpass endpoint queries currently go to; the key of the shared rate limit."""
+    return os.environ.get("KARTA_OVERPASS_URL", DEFAULT_OVERPASS_URL)
+
+
+def overpass_rate():
+    """Queries per second allowed on the endpoint, from ``KARTA_OVERPASS_RATE``."""
+    return float(os.environ.get("KARTA_OVERPASS_RATE", RATE))
+
+
+def overpass_fetcher(bbox, tags):
+    """Default fetcher: features in ``bbox`` (minx, miny, maxx, maxy) via osmnx."""
+    import osmnx as ox
+    if os.environ.get("KARTA_OVERPASS_URL"):
+        set_overpass_url(os.environ["KARTA_OVERPASS_URL"])
+    try:
+        return ox.features_from_polygon(box(*bbox), tags=tags)
+    except Exception as e:
+        # Tile tanpa fitur tetap di-cache sebagai tile kosong
+        if type(e).__name__ == "InsufficientResponseError":
+            return _empty()
+        raise
+
+
+def tag_key(tags):
+    """Stable short hash of an osmnx-style tag dict."""
+    canonical = {key: None if values is None else sorted(values)
+                 for key, values in _normalize_tags(tags).items()}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _to_table(gdf, keys):
+    """Cache columns of an osmnx/osm_local GeoDataFrame as an Arrow table."""
+    gdf = gdf[gdf.geometry.notna()]
+    wkbs = shapely.to_wkb(gdf.geometry.values) if len(gdf) else []
+    tags = {}
+    for key in keys:
+        values = gdf[key] if key in gdf.columns else [None] * len(gdf)
+        tags[key] = [None if v is None or v != v else str(v) for v in values]
+    if "osm_id" in gdf.columns:
+        osm_type, osm_id = gdf["osm_type"].to_numpy(), gdf["osm_id"].to_numpy()
+    elif gdf.index.nlevels == 2:
+        osm_type = gdf.index.get_level_values(0).to_numpy()
+        osm_id = gdf.index.get_level_values(1).to_numpy()
+    else:
+        # Tanpa id OSM: kunci per fitur dari hash geometri + tag, jadi dedup di load()
+        # hanya menggabungkan salinan fitur yang sama dari tile yang berbeda
+        osm_type = np.full(len(gdf), "hash", dtype=object)
+        osm_id = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(wkb + json.dumps(row).encode(), digest_size=8).digest(),
+                            "little", signed=True)
+             for wkb, row in zip(wkbs, zip(*tags.values()) if tags else [()] * len(gdf))),
+            dtype=np.int64, count=len(gdf))
+    columns = {
+        "osm_type": pa.array(osm_type.astype(str) if len(gdf) else [], pa.string()),
+        "osm_id": pa.array(np.asarray(osm_id, dtype=np.int64), pa.int64()),
+        "geometry": pa.array(wkbs, pa.binary()),
+    }
+    for key in keys:
+        columns[key] = pa.array(tags[key], pa.string())
+    return pa.table(columns)
+
+
+def _from_table(table):
+    data = table.to_pydict()
+    geoms = shapely.from_wkb(np.asarray(data.pop("geometry"), dtype=object))
+    return gpd.GeoDataFrame(data, geometry=geoms, crs="EPSG:4326")
+
+
+class TileCache:
+    """Geohash-tiled Overpass cache with TTL and size-bounded LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_DIR, precision=TILE_PRECISION, max_bytes=MAX_BYTES,
+                 ttl=TTL, fetcher=overpass_fetcher, max_query_area=MAX_QUERY_AREA,
+                 workers=WORKERS, retries=RETRIES):
+        self.path = Path(path)
+        self.precision = precision
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.fetcher = fetcher
+        self.max_query_area = max_query_area
+        self.workers = workers
+        self.retries = retries
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.executescript(_INDEX)
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.path / "index.sqlite", timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @property
+    def limiter(self):
+        """Rate limiter of the current endpoint, shared by every cache and page in the process."""
+        return shared_limiter(overpass_endpoint(), overpass_rate())
+
+    def _tile_path(self, key, tile):
+        return self.path / key / f"{tile}.parquet"
+
+    # --- Statistik ----------------------------------------------------------
+
+    def _count(self, db, name, n):
+        if n:
+            db.execute("INSERT INTO stats VALUES (?, ?) "
+                       "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, n))
+
+    def stats(self):
+        """Persistent counters plus current tile count and size on disk."""
+        with self._db() as db:
+            out = {"hits": 0, "misses": 0, "evictions": 0}
+            out.update(dict(db.execute("SELECT name, value FROM stats")))
+            out["tiles"], out["bytes"] = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tiles").fetchone()
+        return out
+
+    # --- Tile ---------------------------------------------------------------
+
+    def tiles_for(self, geom):
+        """Tile geohashes covering ``geom``."""
+        return codec.to_str(polyfill(geom, self.precision), self.precision).tolist()
+
+    def missing(self, tiles, tags):
+        """Tiles not in the cache (or past the TTL) for ``tags``."""
+        key = tag_key(tags)
+        cutoff = time.time() - self.ttl
+        with self._db() as db:
+            fresh = {tile for tile, fetched in db.execute(
+                "SELECT tile, fetched_at FROM tiles WHERE tag_key = ?", (key,)) if fetched >= cutoff}
+        return [tile for tile in tiles if tile not in fresh or not self._tile_path(key, tile).exists()]
+
+    def put(self, tile, tags, gdf):
+        """Store features for one tile (only the part meeting the tile is kept)."""
+        key = tag_key(tags)
+        if len(gdf):
+            minx, miny, maxx, maxy = codec.bounds([tile])[0]
+            gdf = gdf[shapely.intersects(gdf.geometry.values, box(minx, miny, maxx, maxy))]
+        path = self._tile_path(key, tile)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        pq.write_table(_to_table(gdf, list(_normalize_tags(tags))), tmp)
+        os.replace(tmp, path)
+        now = time.time()
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?)",
+                       (key, tile, path.stat().st_size, now, now))
+
+    def fetch_tiles(self, tiles, tags, on_progress=None, workers=None, retries=None):
+        """Download and store ``tiles``, batched into planned query boxes.
+
+        Boxes are fetched concurrently (``workers``, default the cache's)
+        under the endpoint's shared rate limit and retried with backoff.
+        Returns a :class:`FetchReport` per tile; ``on_progress(done, total)``
+        is called (in this thread) per box.
+        """
+        report = FetchReport()
+        if not tiles:
+            return report
+        codes, _ = codec.to_int(tiles)
+        plan = plan_boxes(codes, self.precision, self.max_query_area)
+        jobs = run_jobs(range(len(plan)), lambda i: self.fetcher(plan[i][0], tags),
+                        workers=workers or self.workers,
+                        retries=self.retries if retries is None else retries, limiter=self.limiter)
+        for done, (i, gdf, error) in enumerate(jobs, 1):
+            members = [tiles[j] for j in plan[i][1]]
+            if error is None:
+                for tile in members:
+                    self.put(tile, tags, gdf)
+                report.succeeded.extend(members)
+            else:
+                report.failed.update(dict.fromkeys(members, f"{type(error).__name__}: {error}"))
+            if on_progress:
+                on_progress(done, len(plan))
+        return report
+
+    def load(self, tiles, tags):
+        """Assemble cached ``tiles`` into one GeoDataFrame, de-duplicated by OSM id.
+
+        Raises :class:`MissingTilesError` if any of ``tiles`` is not cached.
+        """
+        key = tag_key(tags)
+        parts = [self._tile_path(key, tile) for tile in tiles]
+        missing = [tile for tile, p in zip(tiles, parts) if not p.exists()]
+        if missing:
+            raise MissingTilesError(missing)
+        tables = [pq.read_table(p) for p in parts]
+        with self._db() as db:
+            db.executemany("UPDATE tiles SET last_used = ? WHERE tag_key = ? AND tile = ?",
+                           [(time.time(), key, tile) for tile in tiles])
+        if not tables:
+            return _empty()
+        gdf = _from_table(pa.concat_tables(tables))
+        # Fitur yang melewati batas tile tersimpan di tiap tile yang disentuhnya
+        return gdf.drop_duplicates(subset=["osm_type", "osm_id"], ignore_index=True)
+
+    def prefetch(self, tiles, tags, on_progress=None, workers=None, retries=None):
+        """Make sure ``tiles`` are cached; returns the :class:`FetchReport` of the download."""
+        with self._lock:
+            missing = self.missing(tiles, tags)
+            report = self.fetch_tiles(missing, tags, on_progress, workers, retries)
+            # Eviksi sekali per permintaan; tile yang diminta tidak ikut dibuang
+            self.evict(pinned={(tag_key(tags), tile) for tile in tiles})
+        with self._db() as db:
+            self._count(db, "hits", len(tiles) - len(missing))
+            self._count(db, "misses", len(missing))
+        return report
+
+    def get(self, tiles, tags):
+        """Features of ``tiles`` (tile geohashes), downloading only missing ones.
+
+        Raises :class:`FetchError` if any tile could not be downloaded.
+        """
+        report = self.prefetch(tiles, tags)
+        if report.failed:
+            raise FetchError(report)
+        return self.load(tiles, tags)
+
+    def features(self, geom, tags):
+        """Features matching ``tags`` that intersect ``geom``, fetched tile by tile."""
+        gdf = self.get(self.tiles_for(geom), tags)
+        if gdf.empty:
+            return gdf
+        return gdf[shapely.intersects(gdf.geometry.values, geom)].reset_index(drop=True)
+
+    def features_from_polygon(self, polygon, tags):
+        """Drop-in for ``ox.features_from_polygon`` backed by the tile cache."""
+        return self.features(polygon, tags)
+
+    # --- Eviksi -------------------------------------------------------------
+
+    def _remove(self, db, rows):
+        for key, tile in rows:
+            self._tile_path(key, tile).unlink(missing_ok=True)
+        db.executemany("DELETE FROM tiles WHERE tag_key = ? AND tile = ?", rows)
+        self._count(db, "evictions", len(rows))
+
+    def evict(self, pinned=()):
+        """Drop expired tiles, then least recently used ones until under ``max_bytes``.
+
+        ``pinned`` ``(tag_key, tile)`` pairs, e.g. the tiles of the request
+        being served, are never removed.
+        """
+        pinned = set(pinned)
+        with self._db() as db:
+            expired = [row for row in db.execute("SELECT tag_key, tile FROM tiles WHERE fetched_at < ?",
+                                                 (time.time() - self.ttl,)) if row not in pinned]
+            self._remove(db, expired)
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, tile, size in db.execute(
+                    "SELECT tag_key, tile, size FROM tiles ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                if (key, tile) in pinned:
+                    continue
+                victims.append((key, tile))
+                total -= size
+            self._remove(db, victims)
+
+    def clear(self):
+        """Remove every cached tile and reset the counters."""
+        with self._db() as db:
+            self._remove(db, db.execute("SELECT tag_key, tile FROM tiles").fetchall())
+            db.execute("DELETE FROM stats")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or clear the shared OSM tile cache.")
+    parser.add_argument("--path", default=str(DEFAULT_CACHE_DIR))
+    parser.add_argument("--clear", action="store_true", help="remove every cached tile")
+    args = parser.parse_args()
+
+    cache = TileCache(args.path)
+    if args.clear:
+        cache.clear()
+    for name, value in cache.stats().items():
+        print(f"{name}: {value:,}")
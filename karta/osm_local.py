@@ -0,0 +1,249 @@
+"""Offline OSM features from a local extract instead of live Overpass calls.
+
+Two sources are supported:
+
+* a pre-converted columnar file (GeoParquet-style: WKB ``geometry``, bbox
+  columns and one string column per tag key), read as a stream of record
+  batches with the bbox and tag filters pushed down to Parquet;
+* a raw ``.osm.pbf`` extract, streamed with pyosmium (optional dependency).
+
+In both cases only features inside the boundary polygon are materialized.
+Convert a PBF once with::
+
+    python -m karta.osm_local indonesia-latest.osm.pbf data/osm/indonesia.parquet
+"""
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shapely
+
+from karta.cover_store import ROOT
+
+DEFAULT_EXTRACT = ROOT / "data" / "osm" / "indonesia.parquet"
+
+# Kunci tag yang disimpan sebagai kolom di file kolumnar
+DEFAULT_KEYS = ("building", "commercial", "highway", "amenity", "shop", "landuse")
+# Kunci yang berupa garis (way terbuka), bukan area
+LINE_KEYS = {"highway"}
+
+BATCH_SIZE = 50_000
+
+
+def _schema(keys):
+    return pa.schema(
+        [("osm_type", pa.string()), ("osm_id", pa.int64()),
+         ("minx", pa.float64()), ("miny", pa.float64()),
+         ("maxx", pa.float64()), ("maxy", pa.float64()),
+         ("geometry", pa.binary())]
+        + [(key, pa.string()) for key in keys],
+        metadata={"geo": '{"primary_column":"geometry","columns":{"geometry":{"encoding":"WKB","crs":"EPSG:4326"}},"version":"1.0.0"}'},
+    )
+
+
+def _normalize_tags(tags):
+    """osmnx-style ``{key: True | value | [values]}`` into ``{key: None | set}``."""
+    out = {}
+    for key, value in tags.items():
+        if value is True:
+            out[key] = None
+        elif isinstance(value, str):
+            out[key] = {value}
+        else:
+            out[key] = set(value)
+    return out
+
+
+def _matches(obj_tags, tags):
+    for key, values in tags.items():
+        value = obj_tags.get(key)
+        if value is not None and (values is None or value in values):
+            return True
+    return False
+
+
+def _tags_filter(tags):
+    expr = None
+    for key, values in tags.items():
+        field = ds.field(key)
+        cond = field.is_valid() if values is None else field.isin(sorted(values))
+        expr = cond if expr is None else expr | cond
+    return expr
+
+
+def _empty():
+    return gpd.GeoDataFrame(columns=["geometry"], geometry="geometry", crs="EPSG:4326")
+
+
+def _concat(parts):
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return _empty()
+    return gpd.GeoDataFrame(pd.concat(parts, ignore_index=True), geometry="geometry", crs="EPSG:4326")
+
+
+def _clip_to_boundary(records, polygon):
+    """GeoDataFrame of ``records`` (dict of columns) whose geometry meets ``polygon``."""
+    if not records["geometry"]:
+        return _empty()
+    geoms = shapely.from_wkb(np.asarray(records.pop("geometry"), dtype=object))
+    mask = shapely.intersects(polygon, geoms)
+    data = {key: np.asarray(values, dtype=object)[mask] for key, values in records.items()}
+    return gpd.GeoDataFrame(data, geometry=geoms[mask], crs="EPSG:4326")
+
+
+# --- Sumber kolumnar --------------------------------------------------------
+
+def read_columnar(path, polygon, tags):
+    """Features matching ``tags`` inside ``polygon`` from a converted extract."""
+    tags = _normalize_tags(tags)
+    dataset = ds.dataset(str(path), format="parquet")
+    missing = set(tags) - set(dataset.schema.names)
+    if missing:
+        raise ValueError(f"Tag keys not in extract: {', '.join(sorted(missing))}")
+
+    shapely.prepare(polygon)
+    minx, miny, maxx, maxy = polygon.bounds
+    bbox = ((ds.field("minx") <= maxx) & (ds.field("maxx") >= minx)
+            & (ds.field("miny") <= maxy) & (ds.field("maxy") >= miny))
+    columns = ["osm_type", "osm_id", "geometry"] + list(tags)
+
+    parts = []
+    for batch in dataset.to_batches(columns=columns, filter=bbox & _tags_filter(tags),
+                                    batch_size=BATCH_SIZE):
+        if batch.num_rows:
+            parts.append(_clip_to_boundary(batch.to_pydict(), polygon))
+    return _concat(parts)
+
+
+# --- Sumber PBF -------------------------------------------------------------
+
+def _import_osmium():
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError(
+            "Reading .osm.pbf extracts needs pyosmium (pip install osmium)"
+        ) from e
+    return osmium
+
+
+def iter_pbf(path, keys, bbox=None):
+    """Stream ``(osm_type, osm_id, wkb, bounds, tags)`` for tagged objects in a PBF.
+
+    Open ways with a line key (``highway``) become LineStrings, areas become
+    MultiPolygons and tagged nodes Points.  With ``bbox`` objects whose
+    bounds miss it are skipped before any geometry is kept.
+    """
+    osmium = _import_osmium()
+    factory = osmium.geom.WKBFactory()
+    processor = (osmium.FileProcessor(str(path))
+                 .with_locations()
+                 .with_areas()
+                 .with_filter(osmium.filter.KeyFilter(*keys)))
+
+    for obj in processor:
+        obj_tags = {key: obj.tags.get(key) for key in keys}
+        try:
+            if obj.is_node():
+                wkb = factory.create_point(obj)
+                kind, osm_id = "node", obj.id
+            elif obj.is_way():
+                if not any(obj_tags.get(k) for k in LINE_KEYS):
+                    continue
+                wkb = factory.create_linestring(obj)
+                kind, osm_id = "way", obj.id
+            elif obj.is_area():
+                if not any(v for k, v in obj_tags.items() if k not in LINE_KEYS):
+                    continue
+                wkb = factory.create_multipolygon(obj)
+                kind = "way" if obj.from_way() else "relation"
+                osm_id = obj.orig_id()
+            else:
+                continue
+        except RuntimeError:
+            # Geometri rusak (node hilang, ring tidak tertutup)
+            continue
+
+        wkb = bytes.fromhex(wkb)
+        bounds = shapely.bounds(shapely.from_wkb(wkb))
+        if bbox is not None and (bounds[0] > bbox[2] or bounds[2] < bbox[0]
+                                 or bounds[1] > bbox[3] or bounds[3] < bbox[1]):
+            continue
+        yield kind, osm_id, wkb, bounds, obj_tags
+
+
+def read_pbf(path, polygon, tags):
+    """Features matching ``tags`` inside ``polygon`` streamed from a ``.osm.pbf``."""
+    tags = _normalize_tags(tags)
+    shapely.prepare(polygon)
+    records = {"osm_type": [], "osm_id": [], "geometry": [], **{key: [] for key in tags}}
+    parts = []
+    for kind, osm_id, wkb, _, obj_tags in iter_pbf(path, list(tags), polygon.bounds):
+        if not _matches(obj_tags, tags):
+            continue
+        records["osm_type"].append(kind)
+        records["osm_id"].append(osm_id)
+        records["geometry"].append(wkb)
+        for key in tags:
+            records[key].append(obj_tags.get(key))
+        if len(records["geometry"]) >= BATCH_SIZE:
+            parts.append(_clip_to_boundary(records, polygon))
+            records = {key: [] for key in ["osm_type", "osm_id", "geometry", *tags]}
+    parts.append(_clip_to_boundary(records, polygon))
+    return _concat(parts)
+
+
+def convert_pbf(pbf_path, out_path, keys=DEFAULT_KEYS):
+    """Stream a ``.osm.pbf`` extract into the columnar format read by :func:`read_columnar`."""
+    keys = list(keys)
+    schema = _schema(keys)
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+
+    def empty():
+        return {name: [] for name in schema.names}
+
+    rows = empty()
+    with pq.ParquetWriter(str(out_path), schema) as writer:
+        for kind, osm_id, wkb, bounds, obj_tags in iter_pbf(pbf_path, keys):
+            rows["osm_type"].append(kind)
+            rows["osm_id"].append(osm_id)
+            for name, value in zip(("minx", "miny", "maxx", "maxy"), bounds):
+                rows[name].append(float(value))
+            rows["geometry"].append(wkb)
+            for key in keys:
+                rows[key].append(obj_tags.get(key))
+            if len(rows["geometry"]) >= BATCH_SIZE:
+                writer.write_table(pa.Table.from_pydict(rows, schema=schema))
+                rows = empty()
+        if rows["geometry"]:
+            writer.write_table(pa.Table.from_pydict(rows, schema=schema))
+    return out_path
+
+
+def extract_keys(path):
+    """Tag keys that can be queried from ``path``; ``None`` for a PBF (any key)."""
+    suffixes = "".join(Path(path).suffixes).lower()
+    if suffixes.endswith((".pbf", ".osm", ".osm.bz2")):
+        return None
+    fixed = set(_schema([]).names)
+    return [name for name in ds.dataset(str(path), format="parquet").schema.names if name not in fixed]
+
+
+def read_features(path, polygon, tags):
+    """Dispatch on the extract type (``.pbf``/``.osm`` or columnar)."""
+    suffixes = "".join(Path(path).suffixes).lower()
+    if suffixes.endswith((".pbf", ".osm", ".osm.bz2")):
+        return read_pbf(path, polygon, tags)
+    return read_columnar(path, polygon, tags)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m karta.osm_local EXTRACT.osm.pbf OUTPUT.parquet")
+    print(convert_pbf(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,187 @@
+"""Exact geohash cover of a geometry by recursive subdivision.
+
+Cells are handled as integers (the geohash bits, 5 per character) so a whole
+level can be tested against the geometry in one vectorized Shapely call.
+Cells fully inside the geometry are expanded straight to the target precision
+without further tests; only boundary cells are refined.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import shapely
+from shapely.geometry import GeometryCollection, shape
+from shapely.validation import make_valid
+
+from karta import codec
+
+_CHILD = np.arange(32, dtype=np.uint64)
+_B = _CHILD.astype(np.int64)
+# Posisi kolom/baris tiap anak (0..31) di dalam sel induk.
+# Level genap: bit lon,lat,lon,lat,lon -> 8 kolom x 4 baris
+# Level ganjil: bit lat,lon,lat,lon,lat -> 4 kolom x 8 baris
+_EVEN = (((_B >> 4) & 1) << 2 | ((_B >> 2) & 1) << 1 | (_B & 1),
+         ((_B >> 3) & 1) << 1 | ((_B >> 1) & 1), 8, 4)
+_ODD = (((_B >> 3) & 1) << 1 | ((_B >> 1) & 1),
+        ((_B >> 4) & 1) << 2 | ((_B >> 2) & 1) << 1 | (_B & 1), 4, 8)
+
+
+def geometry_from_geojson(geojson_data):
+    """Single valid Shapely geometry from a FeatureCollection, Feature or bare geometry."""
+    if 'features' in geojson_data:
+        geometries = [shape(feature['geometry']) for feature in geojson_data['features']
+                      if feature.get('geometry')]
+    elif 'geometry' in geojson_data:
+        geometries = [shape(geojson_data['geometry'])]
+    elif 'type' in geojson_data and 'coordinates' in geojson_data:
+        geometries = [shape(geojson_data)]
+    else:
+        raise ValueError("Unsupported GeoJSON structure")
+    if not geometries:
+        return GeometryCollection()
+
+    geometries = [g if g.is_valid else make_valid(g) for g in geometries]
+    return shapely.union_all(geometries) if len(geometries) > 1 else geometries[0]
+
+
+def _children(codes, bounds, level):
+    """Codes and bounds of the 32 children of every cell at ``level``."""
+    cols, rows, ncol, nrow = _EVEN if level % 2 == 0 else _ODD
+    w, s, e, n = bounds.T
+    dw = ((e - w) / ncol)[:, None]
+    dh = ((n - s) / nrow)[:, None]
+    cw = w[:, None] + cols * dw
+    cs = s[:, None] + rows * dh
+    child_codes = (codes[:, None] << np.uint64(5)) | _CHILD
+    child_bounds = np.stack([cw, cs, cw + dw, cs + dh], axis=-1)
+    return child_codes.ravel(), child_bounds.reshape(-1, 4)
+
+
+def _expand(codes, levels):
+    """All descendants of ``codes`` that are ``levels`` characters deeper."""
+    if levels == 0 or len(codes) == 0:
+        return codes
+    span = np.uint64(1) << np.uint64(5 * levels)
+    offsets = np.arange(int(span), dtype=np.uint64)
+    return ((codes[:, None] << np.uint64(5 * levels)) | offsets).ravel()
+
+
+def _refine(geom, codes, bounds, level, precision):
+    """Cover, at ``precision``, of the part of ``geom`` inside cells at ``level``."""
+    gx0, gy0, gx1, gy1 = geom.bounds
+    result = []
+    for level in range(level, precision):
+        codes, bounds = _children(codes, bounds, level)
+        # Buang sel yang tidak bersinggungan dengan bbox sebelum uji geometri
+        keep = ((bounds[:, 0] <= gx1) & (bounds[:, 2] >= gx0)
+                & (bounds[:, 1] <= gy1) & (bounds[:, 3] >= gy0))
+        codes, bounds = codes[keep], bounds[keep]
+
+        boxes = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+        hit = shapely.intersects(geom, boxes)
+        codes, bounds, boxes = codes[hit], bounds[hit], boxes[hit]
+
+        if level + 1 == precision:
+            result.append(codes)
+            break
+
+        inside = shapely.contains(geom, boxes)
+        result.append(_expand(codes[inside], precision - level - 1))
+        codes, bounds = codes[~inside], bounds[~inside]
+    return result
+
+
+def _merge(parts):
+    out = np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64)
+    out.sort()
+    return out
+
+
+def _check_precision(precision):
+    if not 1 <= precision <= codec.MAX_PRECISION:
+        raise ValueError(f"precision must be between 1 and {codec.MAX_PRECISION}")
+
+
+def polyfill(geom, precision=6):
+    """Sorted uint64 codes of every geohash cell at ``precision`` intersecting ``geom``."""
+    _check_precision(precision)
+    if geom is None or geom.is_empty:
+        return np.empty(0, dtype=np.uint64)
+
+    shapely.prepare(geom)
+    root = np.array([[-180.0, -90.0, 180.0, 90.0]])
+    return _merge(_refine(geom, np.zeros(1, dtype=np.uint64), root, 0, precision))
+
+
+# --- Mode paralel -----------------------------------------------------------
+# Satu tugas = satu geometri utuh, atau sebagian tile kasar dari geometri besar.
+# Worker menyimpan geometri (prepared) terakhir agar tile berurutan dari
+# geometri yang sama tidak di-decode ulang.
+
+_worker_geom = (None, None)
+
+
+def _worker_geometry(wkb):
+    global _worker_geom
+    if _worker_geom[0] != wkb:
+        geom = shapely.from_wkb(wkb)
+        shapely.prepare(geom)
+        _worker_geom = (wkb, geom)
+    return _worker_geom[1]
+
+
+def _polyfill_task(task):
+    wkb, tiles, tile_precision, precision = task
+    geom = _worker_geometry(wkb)
+    if tiles is None:
+        return polyfill(geom, precision)
+    bounds = codec.bounds_int(tiles, tile_precision)
+    return _merge(_refine(geom, tiles, bounds, tile_precision, precision))
+
+
+def process_pool(workers, **kwargs):
+    """Process pool with the ``spawn`` start method, shared by the parallel helpers."""
+    # spawn: aman dipanggil dari server Streamlit yang multi-thread
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), **kwargs)
+
+
+def polyfill_many(geoms, precision=6, workers=None, tile_precision=None, chunks_per_worker=4):
+    """:func:`polyfill` for many geometries on one process pool.
+
+    Small geometries are one task each.  A geometry larger than its fair
+    share (total area over ``workers * chunks_per_worker`` tasks) is split
+    into coarse geohash tiles (``tile_precision``, default three levels
+    above ``precision``) refined as separate tasks, so the largest region
+    is not left to a single core.  Results are returned in input order.
+    """
+    _check_precision(precision)
+    workers = workers or os.cpu_count() or 1
+    if tile_precision is None:
+        tile_precision = max(1, precision - 3)
+    if workers <= 1 or not geoms:
+        return [polyfill(geom, precision) for geom in geoms]
+
+    areas = np.nan_to_num(shapely.area(np.asarray(geoms, dtype=object)).astype(float))
+    share = areas.sum() / (workers * chunks_per_worker)
+    tasks, owners = [], []
+    for i, geom in enumerate(geoms):
+        if geom is None or geom.is_empty:
+            continue
+        wkb = shapely.to_wkb(geom)
+        if tile_precision < precision and share > 0 and areas[i] > share:
+            tiles = polyfill(geom, tile_precision)
+            chunks = np.array_split(tiles, min(len(tiles), int(np.ceil(areas[i] / share))))
+            tasks.extend((wkb, chunk, tile_precision, precision) for chunk in chunks)
+            owners.extend([i] * len(chunks))
+        else:
+            tasks.append((wkb, None, None, precision))
+            owners.append(i)
+    if len(tasks) <= 1:
+        return [polyfill(geom, precision) for geom in geoms]
+
+    parts = [[] for _ in geoms]
+    with process_pool(min(workers, len(tasks))) as pool:
+        for owner, codes in zip(owners, pool.map(_polyfill_task, tasks)):
+            parts[owner].append(codes)
+    return [_merge(p) for p in parts]
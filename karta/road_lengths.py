@@ -0,0 +1,300 @@
+"""Precomputed road length per geohash cell and highway class.
+
+Every geohash6 cell touched by a road of ``road_data.geojson`` is clipped
+once (through :mod:`karta.road_store`) and its length per ``highway`` class
+is stored as a dense table: ``codes.npy`` (sorted cell codes),
+``lengths.npy`` (cells x classes, geodesic metres, float32) and
+``manifest.json`` (class names, source file hash and length method).
+Looking up any set of cells, even a whole province, is a ``searchsorted``
+join against the memory-mapped table.
+
+A fingerprint and bbox per road are kept alongside.  When the road file
+changes only cells touched by added, removed or modified roads are clipped
+again; the rest of the table is carried over.  Build or update with::
+
+    python -m karta.road_lengths [pages/road_data.geojson]
+"""
+import hashlib
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import shapely
+
+from karta import codec
+from karta.cover_store import ROOT, file_hash, install_dir
+from karta.geodesy import geodesic_length
+from karta.neighbors import is_member
+from karta.polyfill import polyfill
+from karta.road_store import DEFAULT_ROADS, open_roads
+
+DEFAULT_STORE_DIR = ROOT / "data" / "road_lengths"
+CHUNK_CELLS = 20_000
+# Bbox jalan lebih dari ini (sel) dicari lewat geometri/prefiks kasar, bukan didaftar per sel
+BBOX_CELLS = 256
+DEFAULT_CLASS = "road"
+# Diganti bila cara mengukur panjang berubah; tabel dengan metode lain dibangun ulang penuh
+LENGTH_METHOD = "wgs84-geodesic"
+
+
+def fingerprints(road_store):
+    """64-bit hash of (geometry, highway) and bbox of every road in the store."""
+    hashes, bounds = [], []
+    for batch in road_store.batches():
+        wkbs = batch.column("geometry").to_pylist()
+        classes = (batch.column("highway").to_pylist() if "highway" in road_store.properties
+                   else [None] * len(wkbs))
+        hashes.append(np.fromiter(
+            (int.from_bytes(hashlib.blake2b(wkb + str(cls).encode(), digest_size=8).digest(), "little")
+             for wkb, cls in zip(wkbs, classes)),
+            dtype=np.uint64, count=len(wkbs)))
+        bounds.append(np.column_stack([batch.column(c).to_numpy() for c in ("minx", "miny", "maxx", "maxy")]))
+    if not hashes:
+        return np.empty(0, dtype=np.uint64), np.empty((0, 4))
+    return np.concatenate(hashes), np.concatenate(bounds)
+
+
+def _box_cells(x0, y0, x1, y1, precision):
+    """Codes of every cell in the column x row ranges, with the index of their box."""
+    # Semua sel dalam rentang kolom x baris tiap bbox, tanpa loop per jalan
+    nx = (x1 - x0 + 1).astype(np.int64)
+    ny = (y1 - y0 + 1).astype(np.int64)
+    sizes = nx * ny
+    box_idx = np.repeat(np.arange(len(sizes)), sizes)
+    local = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    x = x0[box_idx] + (local % nx[box_idx]).astype(np.uint64)
+    y = y0[box_idx] + (local // nx[box_idx]).astype(np.uint64)
+    return codec.from_xy(x, y, precision), box_idx
+
+
+def _box_xy(bounds, precision):
+    x0, y0 = codec.to_xy(codec.encode_int(bounds[:, 1], bounds[:, 0], precision), precision)
+    x1, y1 = codec.to_xy(codec.encode_int(bounds[:, 3], bounds[:, 2], precision), precision)
+    return x0, y0, x1, y1
+
+
+def _cells_within(bounds, within, precision):
+    """Codes of ``within`` meeting the large bboxes, found through coarse prefixes."""
+    x0, y0, x1, y1 = _box_xy(bounds, precision)
+    found = []
+    pending = np.arange(len(bounds))
+    for level in range(precision - 1, 0, -1):
+        # Tiap bbox dicari pada level kasar pertama yang cukup sedikit selnya
+        cx0, cy0, cx1, cy1 = _box_xy(bounds[pending], level)
+        fits = ((cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= BBOX_CELLS) | (level == 1)
+        coarse, idx = _box_cells(cx0[fits], cy0[fits], cx1[fits], cy1[fits], level)
+        boxes = pending[fits][idx]
+        shift = np.uint64(5 * (precision - level))
+        lo = np.searchsorted(within, coarse << shift)
+        hi = np.searchsorted(within, (coarse + np.uint64(1)) << shift)
+        counts = hi - lo
+        rows = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+        codes, boxes = within[rows], np.repeat(boxes, counts)
+        x, y = codec.to_xy(codes, precision)
+        inside = (x >= x0[boxes]) & (x <= x1[boxes]) & (y >= y0[boxes]) & (y <= y1[boxes])
+        found.append(codes[inside])
+        pending = pending[~fits]
+        if len(pending) == 0:
+            break
+    return np.concatenate(found) if found else np.empty(0, dtype=np.uint64)
+
+
+def candidate_cells(bounds, precision=6, within=None):
+    """Sorted codes of every cell meeting any of the bboxes (N x 4).
+
+    With ``within`` (sorted codes), only those cells are returned and bboxes
+    larger than ``BBOX_CELLS`` cells are searched through the coarse
+    prefixes of ``within`` instead of being listed cell by cell.
+    """
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    if len(bounds) == 0:
+        return np.empty(0, dtype=np.uint64)
+    x0, y0, x1, y1 = _box_xy(bounds, precision)
+    if within is None:
+        return np.unique(_box_cells(x0, y0, x1, y1, precision)[0])
+
+    within = np.asarray(within, dtype=np.uint64)
+    large = (x1 - x0 + 1) * (y1 - y0 + 1) > BBOX_CELLS
+    small = ~large
+    cells = _box_cells(x0[small], y0[small], x1[small], y1[small], precision)[0]
+    cells = np.unique(cells)
+    cells = cells[is_member(cells, within)]
+    return np.union1d(cells, _cells_within(bounds[large], within, precision))
+
+
+def road_cells(road_store, mask=None, precision=6):
+    """Sorted codes of the cells touched by the roads of ``road_store`` selected by ``mask``.
+
+    Small roads contribute every cell of their bbox; a road whose bbox spans
+    more than ``BBOX_CELLS`` cells is polyfilled along its geometry, so a
+    long diagonal road does not list its whole bbox.
+    """
+    parts, start = [], 0
+    for batch in road_store.batches():
+        end = start + batch.num_rows
+        rows = np.arange(batch.num_rows) if mask is None else np.flatnonzero(mask[start:end])
+        start = end
+        if len(rows) == 0:
+            continue
+        bounds = np.column_stack([batch.column(c).to_numpy()[rows] for c in ("minx", "miny", "maxx", "maxy")])
+        x0, y0, x1, y1 = _box_xy(bounds, precision)
+        large = (x1 - x0 + 1) * (y1 - y0 + 1) > BBOX_CELLS
+        parts.append(candidate_cells(bounds[~large], precision))
+        if large.any():
+            wkbs = batch.column("geometry").take(pa.array(rows[large])).to_pylist()
+            parts.extend(polyfill(geom, precision) for geom in shapely.from_wkb(wkbs))
+    if not parts:
+        return np.empty(0, dtype=np.uint64)
+    return np.unique(np.concatenate(parts))
+
+
+def measure_cells(road_store, codes, precision=6, chunk_cells=CHUNK_CELLS):
+    """Road length per cell and class for ``codes``.
+
+    Returns ``(codes, classes, lengths)``: the cells with any road, class
+    names and a cells x classes float array in metres.
+    """
+    codes = np.asarray(codes, dtype=np.uint64)
+    frames = []
+    for start in range(0, len(codes), chunk_cells):
+        chunk = codes[start:start + chunk_cells]
+        pieces = road_store.clip(codec.bounds_int(chunk, precision), columns=["highway"])
+        if pieces.empty:
+            continue
+        classes = pieces["highway"] if "highway" in pieces.columns else DEFAULT_CLASS
+        frames.append(pd.DataFrame({
+            "code": chunk[pieces["cell"].to_numpy()],
+            "highway": pd.Series(classes, index=pieces.index).fillna(DEFAULT_CLASS),
+            "length": geodesic_length(pieces.geometry.values),
+        }).groupby(["code", "highway"], sort=False)["length"].sum())
+    if not frames:
+        return np.empty(0, dtype=np.uint64), [], np.empty((0, 0))
+    table = pd.concat(frames).unstack(fill_value=0.0).sort_index()
+    table = table[sorted(table.columns)]
+    return table.index.to_numpy(dtype=np.uint64), list(table.columns), table.to_numpy()
+
+
+def _align(classes, lengths, all_classes):
+    out = np.zeros((len(lengths), len(all_classes)), dtype=np.float32)
+    for i, cls in enumerate(classes):
+        out[:, all_classes.index(cls)] = lengths[:, i]
+    return out
+
+
+def write_table(path, codes, classes, lengths, hashes, bounds, source_hash, precision=6):
+    """Write a length table atomically to the directory ``path``."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    order = np.argsort(hashes)
+    tmp = Path(tempfile.mkdtemp(dir=path.parent, prefix=".tmp_"))
+    try:
+        with open(tmp / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump({"classes": classes, "source_hash": source_hash, "precision": precision,
+                       "length_method": LENGTH_METHOD}, f)
+        np.save(tmp / "codes.npy", np.asarray(codes, dtype=np.uint64))
+        np.save(tmp / "lengths.npy", np.asarray(lengths, dtype=np.float32).reshape(len(codes), len(classes)))
+        np.save(tmp / "road_hashes.npy", hashes[order])
+        np.save(tmp / "road_bounds.npy", bounds[order])
+        install_dir(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return path
+
+
+class RoadLengthTable:
+    """Read-only view over a built length table; arrays are memory-mapped."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.classes = manifest["classes"]
+        self.source_hash = manifest["source_hash"]
+        self.precision = manifest["precision"]
+        self.length_method = manifest.get("length_method")
+        self.codes = np.load(self.path / "codes.npy", mmap_mode="r")
+        self.lengths = np.load(self.path / "lengths.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup(self, codes):
+        """Lengths (metres) for ``codes``, cells x classes; cells without roads get zeros."""
+        codes = np.asarray(codes, dtype=np.uint64)
+        out = np.zeros((len(codes), len(self.classes)))
+        if len(self.codes) == 0:
+            return out
+        idx = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        hit = self.codes[idx] == codes
+        out[hit] = self.lengths[idx[hit]]
+        return out
+
+    def frame(self, geohashes):
+        """``geohash`` + length in km per class and ``total_km`` for geohash strings."""
+        codes, _ = codec.to_int(geohashes)
+        km = self.lookup(codes) / 1000
+        df = pd.DataFrame(km, columns=self.classes)
+        df.insert(0, "geohash", list(geohashes))
+        df["total_km"] = km.sum(axis=1)
+        return df
+
+
+def update_table(roads_path=DEFAULT_ROADS, store_dir=DEFAULT_STORE_DIR, precision=6):
+    """Build the table for ``roads_path`` or bring an existing one up to date.
+
+    Returns ``(path, n_cells)`` with the number of cells that were clipped.
+    """
+    path = Path(store_dir) / Path(roads_path).stem
+    source_hash = file_hash(roads_path)
+    old = RoadLengthTable(path) if (path / "manifest.json").exists() else None
+    if old is not None and (old.precision != precision or old.length_method != LENGTH_METHOD):
+        old = None
+    if old is not None and old.source_hash == source_hash:
+        return path, 0
+
+    road_store = open_roads(roads_path)
+    hashes, bounds = fingerprints(road_store)
+    if old is not None:
+        old_hashes = np.load(path / "road_hashes.npy")
+        old_bounds = np.load(path / "road_bounds.npy")
+        added = ~is_member(hashes, old_hashes)
+        removed = ~is_member(old_hashes, np.sort(hashes))
+        # Sel yang disentuh jalan yang berubah, baik versi lama maupun baru
+        affected = np.union1d(road_cells(road_store, added, precision),
+                              candidate_cells(old_bounds[removed], precision, within=np.asarray(old.codes)))
+        keep = ~is_member(np.asarray(old.codes), affected)
+        kept = (np.asarray(old.codes)[keep], old.classes, np.asarray(old.lengths)[keep])
+    else:
+        affected = road_cells(road_store, precision=precision)
+        kept = (np.empty(0, dtype=np.uint64), [], np.empty((0, 0)))
+
+    new = measure_cells(road_store, affected, precision)
+    classes = sorted(set(kept[1]) | set(new[1]))
+    codes = np.concatenate([kept[0], new[0]])
+    lengths = np.concatenate([_align(kept[1], kept[2], classes), _align(new[1], new[2], classes)])
+    order = np.argsort(codes)
+    write_table(path, codes[order], classes, lengths[order], hashes, bounds, source_hash, precision)
+    return path, len(affected)
+
+
+def open_lengths(roads_path=DEFAULT_ROADS, store_dir=DEFAULT_STORE_DIR, precision=6):
+    """Open the length table for the current road file, updating it first if needed."""
+    path, _ = update_table(roads_path, store_dir, precision)
+    return RoadLengthTable(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or update the per-geohash road length table.")
+    parser.add_argument("roads", nargs="?", default=str(DEFAULT_ROADS))
+    parser.add_argument("--precision", type=int, default=6)
+    args = parser.parse_args()
+
+    path, n_cells = update_table(args.roads, precision=args.precision)
+    print(f"{args.roads} -> {path} ({n_cells:,} cells clipped)")
@@ -0,0 +1,230 @@
+"""Spatially sorted road store for clipping roads to geohash cells.
+
+The road file is converted once into an Arrow IPC file: line features
+sorted by the geohash of their bbox centre, written in blocks of
+``BLOCK_SIZE`` rows with per-row bbox columns, WKB ``geometry`` and the
+feature properties as strings.  The bbox of every block is kept in the
+schema metadata, so a clip request only reads the blocks, and decodes only
+the rows, whose bboxes meet the requested cells.  Cells are axis-aligned
+rectangles, so pieces are cut with GEOS rectangle clipping instead of a
+general polygon overlay.
+
+Like the boundary store, the file name carries a hash of the source file
+and a changed road file is converted again on the next open.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import shapely
+
+from karta import codec
+from karta.cover_store import ROOT, file_hash
+from karta.road_stream import MEMORY_BUDGET, clip_pairs, iter_roads
+
+DEFAULT_STORE_DIR = ROOT / "data" / "roads"
+DEFAULT_ROADS = ROOT / "pages" / "road_data.geojson"
+
+BLOCK_SIZE = 4096
+# Batch kecil di run sementara: saat merge hanya satu batch per run yang ditahan
+RUN_BATCH = 256
+BOUNDS = ["minx", "miny", "maxx", "maxy"]
+
+
+def _sorted_table(roads, properties):
+    """Arrow table of one batch of roads sorted by geohash, with the ``_key`` column and bounds."""
+    geoms = roads.geometry.values
+    bounds = shapely.bounds(geoms)
+    # Urutkan menurut geohash pusat bbox supaya jalan yang berdekatan ada di blok yang sama
+    key = codec.encode_int((bounds[:, 1] + bounds[:, 3]) / 2, (bounds[:, 0] + bounds[:, 2]) / 2, 6)
+    order = np.argsort(key, kind="stable")
+    columns = {"_key": pa.array(key[order], pa.uint64())}
+    columns.update({name: pa.array(bounds[order, i], pa.float64()) for i, name in enumerate(BOUNDS)})
+    columns["geometry"] = pa.array(shapely.to_wkb(np.asarray(geoms)[order]), pa.binary())
+    for name in properties:
+        values = roads[name].to_numpy(dtype=object)[order] if name in roads.columns else [None] * len(roads)
+        columns[name] = pa.array([None if v is None or v != v else str(v) for v in values], pa.string())
+    return pa.table(columns)
+
+
+def _write_ipc(path, batches, schema):
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _merge_runs(runs, block_size, columns):
+    """Yield globally sorted tables of ``block_size`` rows (``columns`` only) from sorted runs.
+
+    A k-way merge over the memory-mapped runs: only about one
+    ``RUN_BATCH`` batch of every run is held.  Each step emits the buffered
+    rows below the smallest last key among runs not yet fully read, which
+    no row still on disk can precede; equal keys keep their input order.
+    """
+    readers = [pa.ipc.open_file(pa.memory_map(str(run), "r")) for run in runs]
+    readers = [reader for reader in readers if reader.num_record_batches]
+    next_batch = [0] * len(readers)
+
+    def more(run):
+        return next_batch[run] < readers[run].num_record_batches
+
+    def load(run):
+        batch = readers[run].get_batch(next_batch[run]).select(["_key", *columns])
+        next_batch[run] += 1
+        return pa.Table.from_batches([batch])
+
+    buffers = [load(run) for run in range(len(readers))]
+    pending, n_pending = [], 0
+    while any(buffer.num_rows for buffer in buffers):
+        reading = [run for run in range(len(readers)) if more(run)]
+        threshold = min((buffers[run]["_key"][-1].as_py() for run in reading), default=None)
+        parts = []
+        for run, buffer in enumerate(buffers):
+            keys = buffer["_key"].to_numpy()
+            n = len(keys) if threshold is None else int(np.searchsorted(keys, threshold, side="left"))
+            parts.append(buffer.slice(0, n))
+            buffers[run] = buffer.slice(n)
+        # Run yang buffernya berakhir di ambang dibaca lanjut agar kunci sama tetap urut masukan
+        for run in reading:
+            if buffers[run]["_key"][-1].as_py() == threshold:
+                buffers[run] = pa.concat_tables([buffers[run], load(run)])
+        merged = pa.concat_tables(parts)
+        merged = merged.take(pa.array(np.argsort(merged["_key"].to_numpy(), kind="stable")))
+        pending.append(merged.select(columns))
+        n_pending += merged.num_rows
+        while n_pending >= block_size:
+            table = pa.concat_tables(pending).combine_chunks()
+            yield table.slice(0, block_size)
+            pending, n_pending = [table.slice(block_size)], n_pending - block_size
+    if n_pending:
+        yield pa.concat_tables(pending).combine_chunks()
+
+
+def convert_roads(roads_path, path, block_size=BLOCK_SIZE, budget=MEMORY_BUDGET):
+    """Convert a road file into a sorted, block-indexed Arrow IPC store at ``path``.
+
+    The road file is streamed in batches sized from ``budget``: each batch
+    is sorted and spilled as a run, then the runs are merged on disk twice,
+    once over the bbox columns for the block index and once to write the
+    rows.  No per-feature array is kept, so memory stays bounded whatever
+    the size of the road file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(dir=path.parent, prefix=".tmp_runs_"))
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_", suffix=".arrow")
+    os.close(fd)
+    try:
+        properties = None
+        runs = []
+        for roads in iter_roads(roads_path, budget=budget):
+            if properties is None:
+                properties = [c for c in roads.columns if c != roads.geometry.name]
+            table = _sorted_table(roads, properties)
+            runs.append(run_dir / f"run_{len(runs)}.arrow")
+            _write_ipc(runs[-1], table.to_batches(max_chunksize=RUN_BATCH), table.schema)
+
+        properties = properties or []
+        columns = BOUNDS + ["geometry"] + properties
+        schema = pa.schema([(name, pa.float64()) for name in BOUNDS] + [("geometry", pa.binary())]
+                           + [(name, pa.string()) for name in properties])
+        # Lintasan pertama hanya kolom bbox: indeks blok harus ada di skema sebelum baris ditulis
+        blocks = [
+            [pc.min(block["minx"]).as_py(), pc.min(block["miny"]).as_py(),
+             pc.max(block["maxx"]).as_py(), pc.max(block["maxy"]).as_py()]
+            for block in _merge_runs(runs, block_size, BOUNDS)
+        ]
+        schema = schema.with_metadata({
+            "blocks": json.dumps(blocks),
+            "properties": json.dumps(properties),
+        })
+        batches = (batch for table in _merge_runs(runs, block_size, columns) for batch in table.to_batches())
+        _write_ipc(tmp, batches, schema)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return path
+
+
+class RoadStore:
+    """Memory-mapped reader over a converted road file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._reader = pa.ipc.open_file(pa.memory_map(str(self.path), "r"))
+        metadata = self._reader.schema.metadata
+        self.properties = json.loads(metadata[b"properties"])
+        self.block_bounds = np.array(json.loads(metadata[b"blocks"]), dtype=float).reshape(-1, 4)
+        self._blocks = shapely.STRtree(shapely.box(*self.block_bounds.T))
+        self._lock = threading.Lock()
+
+    def _batch(self, i):
+        with self._lock:
+            return self._reader.get_batch(i)
+
+    def batches(self):
+        """Iterate over the stored blocks as Arrow record batches."""
+        for i in range(self._reader.num_record_batches):
+            yield self._batch(i)
+
+    def blocks_for(self, rects):
+        """Indices of the blocks whose bbox meets any of ``rects`` (N x 4)."""
+        rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+        _, blocks = self._blocks.query(shapely.box(*rects.T), predicate="intersects")
+        return np.unique(blocks)
+
+    def clip(self, rects, columns=None):
+        """Road pieces inside each rectangle of ``rects`` (N x 4: minx, miny, maxx, maxy).
+
+        Returns a GeoDataFrame with a ``cell`` column (row of ``rects`` the
+        piece belongs to), the requested property ``columns`` (default all)
+        and the clipped ``geometry``.
+        """
+        rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+        columns = self.properties if columns is None else [c for c in columns if c in self.properties]
+        cell_tree = shapely.STRtree(shapely.box(*rects.T))
+
+        parts = []
+        for block in self.blocks_for(rects):
+            batch = self._batch(block)
+            row_bounds = np.column_stack([batch.column(name).to_numpy() for name in BOUNDS])
+            rows, cells = cell_tree.query(shapely.box(*row_bounds.T), predicate="intersects")
+            if len(rows) == 0:
+                continue
+            # Hanya baris yang bbox-nya menyentuh sel yang di-decode dari WKB
+            needed, inverse = np.unique(rows, return_inverse=True)
+            geoms = shapely.from_wkb(batch.column("geometry").take(pa.array(needed)).to_numpy(zero_copy_only=False))
+            part = {"cell": cells, "geometry": clip_pairs(geoms[inverse], rects[cells])}
+            for name in columns:
+                part[name] = batch.column(name).take(pa.array(rows)).to_numpy(zero_copy_only=False)
+            parts.append(part)
+
+        if not parts:
+            return gpd.GeoDataFrame({"cell": np.empty(0, dtype=np.int64), **{c: [] for c in columns}},
+                                    geometry=[], crs="EPSG:4326")
+        data = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+        keep = ~shapely.is_empty(data["geometry"])
+        gdf = gpd.GeoDataFrame({key: values[keep] for key, values in data.items()},
+                               geometry="geometry", crs="EPSG:4326")
+        return gdf.sort_values("cell", kind="stable", ignore_index=True)
+
+
+def open_roads(roads_path=DEFAULT_ROADS, store_dir=DEFAULT_STORE_DIR, budget=MEMORY_BUDGET):
+    """Open the store for a road file, converting it first (within ``budget`` bytes) if needed."""
+    path = Path(store_dir) / f"{Path(roads_path).stem}_{file_hash(roads_path)}.arrow"
+    if not path.exists():
+        convert_roads(roads_path, path, budget=budget)
+        for old in Path(store_dir).glob(f"{Path(roads_path).stem}_*.arrow"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    return RoadStore(path)
@@ -0,0 +1,105 @@
+"""Memory-bounded streaming over large road files.
+
+Road files are read through ``pyogrio.open_arrow`` as a stream of record
+batches, optionally restricted to a bbox, with the batch size derived from
+a memory budget and the file's average bytes per feature.  Only one batch
+(plus its clipped pieces) is alive at a time, so peak memory no longer
+grows with the national road file.
+"""
+import os
+
+import geopandas as gpd
+import numpy as np
+import pyogrio
+import shapely
+
+from karta.geodesy import geodesic_length
+
+MEMORY_BUDGET = 512 << 20
+# Perkiraan salinan per baris yang hidup bersamaan: teks, WKB, shapely, potongan clip
+_COPIES = 8
+MIN_ROWS = 1_000
+# Perkiraan memori per potongan hasil clip (geometri, kolom, indeks)
+PIECE_BYTES = 1024
+LINE_TYPES = ["LineString", "MultiLineString"]
+
+
+def chunk_rows(path, budget=MEMORY_BUDGET):
+    """Rows per batch so that one batch stays well inside ``budget`` bytes."""
+    info = pyogrio.read_info(path)
+    per_row = os.path.getsize(path) / max(info["features"], 1)
+    return max(MIN_ROWS, int(budget / (per_row * _COPIES)))
+
+
+def _geometry_column(schema):
+    for field in schema:
+        metadata = field.metadata or {}
+        if metadata.get(b"ARROW:extension:name") == b"geoarrow.wkb":
+            return field.name
+    return "wkb_geometry"
+
+
+def iter_roads(path, bbox=None, budget=MEMORY_BUDGET, columns=None):
+    """Yield line roads of ``path`` as EPSG:4326 GeoDataFrames of bounded size.
+
+    ``bbox`` (minx, miny, maxx, maxy in EPSG:4326) is pushed down to the
+    reader; ``columns`` limits the property columns read.
+    """
+    crs = pyogrio.read_info(path)["crs"] or "EPSG:4326"
+    if bbox is not None and crs != "EPSG:4326":
+        bbox = tuple(gpd.GeoSeries([shapely.box(*bbox)], crs="EPSG:4326").to_crs(crs).total_bounds)
+    with pyogrio.open_arrow(path, bbox=bbox, columns=columns, batch_size=chunk_rows(path, budget),
+                            use_pyarrow=True) as (_, reader):
+        for batch in reader:
+            geometry = _geometry_column(batch.schema)
+            properties = {
+                name: batch.column(name).to_numpy(zero_copy_only=False)
+                for name in batch.schema.names if name != geometry
+            }
+            geoms = shapely.from_wkb(batch.column(geometry).to_numpy(zero_copy_only=False))
+            gdf = gpd.GeoDataFrame(properties, geometry=geoms, crs=crs)
+            gdf = gdf[gdf.geometry.type.isin(LINE_TYPES)]
+            if crs != "EPSG:4326":
+                gdf = gdf.to_crs("EPSG:4326")
+            if not gdf.empty:
+                yield gdf.reset_index(drop=True)
+
+
+def clip_pairs(geoms, rects):
+    """``clip_by_rect`` of each geometry with its own rectangle (grouped per rectangle)."""
+    out = np.empty(len(geoms), dtype=object)
+    order = np.lexsort(rects.T[::-1])
+    sorted_rects = rects[order]
+    starts = np.flatnonzero(np.r_[True, np.any(sorted_rects[1:] != sorted_rects[:-1], axis=1)])
+    for start, stop in zip(starts, np.r_[starts[1:], len(order)]):
+        idx = order[start:stop]
+        out[idx] = shapely.clip_by_rect(geoms[idx], *sorted_rects[start])
+    return out
+
+
+def iter_clipped(path, rects, budget=MEMORY_BUDGET, columns=None):
+    """Stream road pieces clipped to ``rects`` (N x 4), one batch at a time.
+
+    Only the bbox around all rectangles is read.  Each yielded GeoDataFrame
+    has the ``cell`` (row of ``rects``) and geodesic ``length_m`` of every
+    piece besides the requested property ``columns``.
+    """
+    rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+    if len(rects) == 0:
+        return
+    extent = (rects[:, 0].min(), rects[:, 1].min(), rects[:, 2].max(), rects[:, 3].max())
+    cell_tree = shapely.STRtree(shapely.box(*rects.T))
+    max_pieces = max(MIN_ROWS, budget // (2 * PIECE_BYTES))
+    for roads in iter_roads(path, extent, budget // 2, columns):
+        rows, cells = cell_tree.query(roads.geometry.values, predicate="intersects")
+        geoms = np.asarray(roads.geometry.values)
+        properties = roads.drop(columns=roads.geometry.name)
+        # Jalan yang melintasi banyak sel menghasilkan banyak potongan; batasi per yield
+        for start in range(0, len(rows), max_pieces):
+            sub_rows, sub_cells = rows[start:start + max_pieces], cells[start:start + max_pieces]
+            pieces = clip_pairs(geoms[sub_rows], rects[sub_cells])
+            keep = ~shapely.is_empty(pieces)
+            out = properties.iloc[sub_rows[keep]].reset_index(drop=True)
+            out.insert(0, "cell", sub_cells[keep])
+            out["length_m"] = geodesic_length(pieces[keep])
+            yield gpd.GeoDataFrame(out, geometry=pieces[keep], crs="EPSG:4326")
@@ -0,0 +1,291 @@
+"""Multi-level UKM rollup cube: road length by geohash prefix and admin region.
+
+The per-cell road length table (:mod:`karta.road_lengths`) is rolled up
+once into every geohash prefix level (6 down to 1, by truncating the
+integer codes) and into every admin region of the bundled boundary files.
+Each cell belongs to exactly one region per boundary file: the region
+whose cover contains it, or, for border cells in several covers, the one
+containing the cell centre.  Any level or region total is then a
+``searchsorted`` lookup.
+
+The cube directory holds ``manifest.json`` plus one pair of ``.npy``
+arrays (codes, values) per level and one values array per region field.
+When cell values change, only the differences are pushed up the levels and
+into the regions; a changed boundary file triggers a full rebuild.
+"""
+import json
+import shutil
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from karta import codec
+from karta.boundaries import open_boundaries
+from karta.cover_store import BOUNDARY_SOURCES, ROOT, file_hash, install_dir, open_store
+
+DEFAULT_STORE_DIR = ROOT / "data" / "rollup"
+LEVELS = (6, 5, 4, 3, 2, 1)
+
+
+@lru_cache(maxsize=4)
+def _cover_index(cover_store):
+    """All cover codes of ``cover_store`` sorted, with the region index of each."""
+    names = cover_store.names
+    region_codes = [cover_store.codes(name) for name in names]
+    all_codes = np.concatenate(region_codes) if names else np.empty(0, dtype=np.uint64)
+    all_ids = np.repeat(np.arange(len(names)), [len(c) for c in region_codes])
+    order = np.argsort(all_codes, kind="stable")
+    return all_codes[order], all_ids[order]
+
+
+def assign_regions(codes, cover_store, boundary_store, precision=6):
+    """Region index (into ``cover_store.names``) of each cell; -1 outside every region."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    names = cover_store.names
+    all_codes, all_ids = _cover_index(cover_store)
+
+    left = np.searchsorted(all_codes, codes, side="left")
+    right = np.searchsorted(all_codes, codes, side="right")
+    out = np.where(right > left, all_ids[np.minimum(left, len(all_ids) - 1)], -1).astype(np.int32)
+
+    # Sel perbatasan (ada di beberapa cover): pilih wilayah yang memuat pusat sel
+    shared = np.flatnonzero(right - left > 1)
+    if len(shared):
+        lat, lon = codec.centers_int(codes[shared], precision)
+        counts = (right - left)[shared]
+        pair_cell = np.repeat(np.arange(len(shared)), counts)
+        pair_pos = np.repeat(left[shared], counts) + np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        pair_region = all_ids[pair_pos]
+        hit = np.zeros(len(pair_cell), dtype=bool)
+        for region in np.unique(pair_region):
+            mask = pair_region == region
+            geom = boundary_store.geometry(names[region])
+            hit[mask] = shapely.contains_xy(geom, lon[pair_cell[mask]], lat[pair_cell[mask]])
+        # Pasangan pertama yang memuat pusat; kalau tidak ada, tetap wilayah pertama
+        cells, first = np.unique(pair_cell[hit], return_index=True)
+        out[shared[cells]] = pair_region[np.flatnonzero(hit)[first]]
+    return out
+
+
+def open_regions():
+    """``[(field, cover_store, boundary_store, source_hash)]`` for the bundled boundaries."""
+    regions = []
+    for boundary_path, field in BOUNDARY_SOURCES:
+        if Path(boundary_path).exists():
+            regions.append((field, open_store(boundary_path, field), open_boundaries(boundary_path, field),
+                            file_hash(boundary_path)))
+    return regions
+
+
+def region_names(codes, regions, field, precision=6):
+    """Region name of ``field`` for each cell (None outside every region), with or without roads."""
+    for region_field, cover_store, boundary_store, _ in regions:
+        if region_field == field:
+            index = assign_regions(codes, cover_store, boundary_store, precision)
+            return np.array(cover_store.names + [None], dtype=object)[index]
+    raise KeyError(field)
+
+
+def _levels(codes, values, precision, levels):
+    out = {}
+    for level in levels:
+        prefix = codes >> np.uint64(5 * (precision - level))
+        uniq, inverse = np.unique(prefix, return_inverse=True)
+        sums = np.zeros((len(uniq), values.shape[1]))
+        np.add.at(sums, inverse, values)
+        out[level] = (uniq, sums)
+    return out
+
+
+def write_cube(path, manifest, arrays):
+    """Write cube arrays atomically to the directory ``path``."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=path.parent, prefix=".tmp_"))
+    try:
+        with open(tmp / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", array)
+        install_dir(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return path
+
+
+class RollupCube:
+    """Read-only view over a built cube; every lookup is a binary search."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.classes = self.manifest["classes"]
+        self.precision = self.manifest["precision"]
+        self.levels = self.manifest["levels"]
+        self.fields = list(self.manifest["regions"])
+        self._arrays = {p.stem: np.load(p, mmap_mode="r") for p in self.path.glob("*.npy")}
+
+    def _level(self, level):
+        return self._arrays[f"level{level}_codes"], self._arrays[f"level{level}_values"]
+
+    def names(self, field):
+        """Region names of boundary ``field`` (e.g. ``WADMKK``), in cube order."""
+        return self.manifest["regions"][field]["names"]
+
+    def frame(self, level):
+        """Whole cube level as ``geohash`` + km per class + ``total_km``."""
+        codes, values = self._level(level)
+        return self._frame(codec.to_str(np.asarray(codes), level).tolist(), np.asarray(values), "geohash")
+
+    def region_frame(self, field):
+        """Totals per region of ``field`` as ``region`` + km per class + ``total_km``."""
+        return self._frame(self.names(field), np.asarray(self._arrays[f"region_{field}_values"]), "region")
+
+    def _frame(self, keys, values, key_name):
+        km = values / 1000
+        df = pd.DataFrame(km, columns=self.classes)
+        df.insert(0, key_name, keys)
+        df["total_km"] = km.sum(axis=1)
+        return df
+
+    def lookup(self, codes, level):
+        """Lengths (metres) per class for integer geohash ``codes`` of ``level``; zeros without roads."""
+        level_codes, values = self._level(level)
+        codes = np.asarray(codes, dtype=np.uint64)
+        out = np.zeros((len(codes), len(self.classes)))
+        if len(level_codes) == 0:
+            return out
+        idx = np.minimum(np.searchsorted(level_codes, codes), len(level_codes) - 1)
+        hit = level_codes[idx] == codes
+        out[hit] = values[idx[hit]]
+        return out
+
+    def total(self, geohash):
+        """Length (metres) per class inside one geohash of any stored level."""
+        return self.lookup(codec.to_int([geohash])[0], len(geohash))[0]
+
+    def region_total(self, field, name):
+        """Length (metres) per class inside region ``name`` of ``field``."""
+        return np.asarray(self._arrays[f"region_{field}_values"][self.names(field).index(name)])
+
+
+def build_cube(codes, values, classes, regions, path, precision=6, levels=LEVELS, source=None):
+    """Roll per-cell ``values`` (cells x classes, metres) up into a cube at ``path``."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    values = np.asarray(values, dtype=float).reshape(len(codes), len(classes))
+    # Sel tanpa panjang jalan tidak disimpan, sama seperti pada update_cube
+    present = np.any(values != 0, axis=1)
+    codes, values = codes[present], values[present]
+    arrays = {}
+    for level, (level_codes, sums) in _levels(codes, values, precision, levels).items():
+        arrays[f"level{level}_codes"] = level_codes
+        arrays[f"level{level}_values"] = sums
+    manifest = {"classes": list(classes), "precision": precision, "levels": list(levels),
+                "source": source, "regions": {}}
+    for field, cover_store, boundary_store, source_hash in regions:
+        region = assign_regions(codes, cover_store, boundary_store, precision)
+        sums = np.zeros((len(cover_store.names), len(classes)))
+        inside = region >= 0
+        np.add.at(sums, region[inside], values[inside])
+        arrays[f"base_{field}"] = region
+        arrays[f"region_{field}_values"] = sums
+        manifest["regions"][field] = {"names": cover_store.names, "hash": source_hash}
+    write_cube(path, manifest, arrays)
+    return RollupCube(path)
+
+
+def update_cube(cube, codes, values, regions, source=None):
+    """Push changed cell values into ``cube``; returns the updated cube.
+
+    ``codes``/``values`` are the full current per-cell table.  Only cells
+    whose values differ are applied, as deltas, to every level and region.
+    """
+    manifest = dict(cube.manifest, source=source)
+    codes = np.asarray(codes, dtype=np.uint64)
+    values = np.asarray(values, dtype=float).reshape(len(codes), len(cube.classes))
+    old_codes, old_values = (np.asarray(a) for a in cube._level(cube.precision))
+
+    union = np.union1d(old_codes, codes)
+    old_aligned = np.zeros((len(union), len(cube.classes)))
+    new_aligned = np.zeros_like(old_aligned)
+    old_aligned[np.searchsorted(union, old_codes)] = old_values
+    new_aligned[np.searchsorted(union, codes)] = values
+    delta = new_aligned - old_aligned
+    changed = np.flatnonzero(np.any(delta != 0, axis=1))
+    if len(changed) == 0:
+        return RollupCube(write_cube(cube.path, manifest, cube._arrays))
+    changed_codes, delta = union[changed], delta[changed]
+
+    arrays = {}
+    base_present = np.any(new_aligned != 0, axis=1)
+    for level in cube.levels:
+        shift = np.uint64(5 * (cube.precision - level))
+        if level == cube.precision:
+            arrays[f"level{level}_codes"] = union[base_present]
+            arrays[f"level{level}_values"] = new_aligned[base_present]
+            continue
+        level_codes, level_values = (np.asarray(a) for a in cube._level(level))
+        # Baris level = prefix yang masih punya sel dasar; nilai lama + delta
+        new_level_codes = np.unique(union[base_present] >> shift)
+        new_level_values = np.zeros((len(new_level_codes), len(cube.classes)))
+        keep = np.isin(level_codes, new_level_codes)
+        new_level_values[np.searchsorted(new_level_codes, level_codes[keep])] = level_values[keep]
+        prefix = changed_codes >> shift
+        live = np.isin(prefix, new_level_codes)
+        np.add.at(new_level_values, np.searchsorted(new_level_codes, prefix[live]), delta[live])
+        arrays[f"level{level}_codes"] = new_level_codes
+        arrays[f"level{level}_values"] = new_level_values
+
+    for field, cover_store, boundary_store, _ in regions:
+        old_region = np.asarray(cube._arrays[f"base_{field}"])
+        region = np.full(len(union), -1, dtype=np.int32)
+        region[np.searchsorted(union, old_codes)] = old_region
+        # Sel baru (belum ada di kubus) diberi wilayah; sel lama memakai wilayah tersimpan
+        fresh = ~np.isin(union, old_codes)
+        region[fresh] = assign_regions(union[fresh], cover_store, boundary_store, cube.precision)
+        sums = np.array(cube._arrays[f"region_{field}_values"])
+        changed_region = region[changed]
+        inside = changed_region >= 0
+        np.add.at(sums, changed_region[inside], delta[inside])
+        arrays[f"base_{field}"] = region[base_present]
+        arrays[f"region_{field}_values"] = sums
+    return RollupCube(write_cube(cube.path, manifest, arrays))
+
+
+def open_cube(length_table, store_dir=DEFAULT_STORE_DIR, regions=None):
+    """Cube matching ``length_table``: built on first use, updated incrementally after."""
+    regions = open_regions() if regions is None else regions
+    path = Path(store_dir) / length_table.path.name
+    codes, values = np.asarray(length_table.codes), np.asarray(length_table.lengths, dtype=float)
+    hashes = {field: source_hash for field, _, _, source_hash in regions}
+
+    if (path / "manifest.json").exists():
+        cube = RollupCube(path)
+        same_regions = {f: r["hash"] for f, r in cube.manifest["regions"].items()} == hashes
+        if same_regions and cube.classes == length_table.classes and cube.precision == length_table.precision:
+            if cube.manifest.get("source") == length_table.source_hash:
+                return cube
+            return update_cube(cube, codes, values, regions, length_table.source_hash)
+    return build_cube(codes, values, length_table.classes, regions, path,
+                      length_table.precision, source=length_table.source_hash)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from karta.road_lengths import DEFAULT_ROADS, open_lengths
+
+    parser = argparse.ArgumentParser(description="Build or update the road length rollup cube.")
+    parser.add_argument("roads", nargs="?", default=str(DEFAULT_ROADS))
+    args = parser.parse_args()
+
+    cube = open_cube(open_lengths(args.roads))
+    sizes = ", ".join(f"gh{level}: {len(cube._level(level)[0]):,}" for level in cube.levels)
+    print(f"{cube.path} ({sizes}; regions: {', '.join(cube.fields)})")
@@ -4,120 +4,52 @@ import folium
 from streamlit_folium import st_folium
 import os
 import numpy as np
-from shapely.geometry import shape, GeometryCollection, box, Polygon
-from shapely.validation import make_valid
-import geohash2
-import pandas as pd
-
-# Fungsi bantu untuk bounding map
-def get_bounds_from_geojson(geojson):
-    bounds = [[90, 180], [-90, -180]]
-    for feature in geojson['features']:
-        coords = feature['geometry']['coordinates']
-        if feature['geometry']['type'] == 'Polygon':
-            rings = [coords]
-        else:  # MultiPolygon
-            rings = coords
-        for ring in rings:
-            for point in ring[0]:
-                lon, lat = point
-                bounds[0][0] = min(bounds[0][0], lat)
-                bounds[0][1] = min(bounds[0][1], lon)
-                bounds[1][0] = max(bounds[1][0], lat)
-                bounds[1][1] = max(bounds[1][1], lon)
-    return bounds
-
-# Fungsi GeoJSON ke GeoHash
-@st.cache_data(show_spinner="⏳ Processing GeoHash...")
-def geojson_to_geohash6(geojson_data, precision=6, step=0.005):
-    if 'features' in geojson_data:
-        geometries = [shape(feature['geometry']) for feature in geojson_data['features']]
-    elif 'geometry' in geojson_data:
-        geometries = [shape(geojson_data['geometry'])]
-    elif 'type' in geojson_data and 'coordinates' in geojson_data:
-        geometries = [shape(geojson_data)]
-    else:
-        raise ValueError("Unsupported GeoJSON structure")
-
-    full_geom = GeometryCollection(geometries) if len(geometries) > 1 else geometries[0]
-    if not full_geom.is_valid:
-        full_geom = make_valid(full_geom)
-
-    minx, miny, maxx, maxy = full_geom.bounds
-
-    # Gunakan linspace untuk kurangi jumlah iterasi (lebih cepat)
-    x_steps = np.linspace(minx, maxx, int((maxx - minx)/step))
-    y_steps = np.linspace(miny, maxy, int((maxy - miny)/step))
-
-    geohashes = set()
-    for lat in y_steps:
-        for lon in x_steps:
-            cell = box(lon, lat, lon + step, lat + step)
-            if full_geom.intersects(cell):
-                gh = geohash2.encode(lat, lon, precision)
-                geohashes.add(gh)
-    return geohashes
-
-# Fungsi GeoHash ke GeoJSON
-def geohash6_to_geojson(geohashes):
-    features = []
-    for gh in geohashes:
-        lat, lon, lat_err, lon_err = geohash2.decode_exactly(gh)
-        cell = {
-            "n": lat + lat_err,
-            "s": lat - lat_err,
-            "e": lon + lon_err,
-            "w": lon - lon_err,
-        }
-        poly = Polygon([
-            (cell['w'], cell['s']),
-            (cell['e'], cell['s']),
-            (cell['e'], cell['n']),
-            (cell['w'], cell['n']),
-            (cell['w'], cell['s']),
-        ])
-        features.append({
-            "type": "Feature",
-            "geometry": json.loads(json.dumps(poly.__geo_interface__)),
-            "properties": {"Name": gh}
-        })
-
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
-
-def geohash_to_csv(geohashes):
-    rows = []
-    for gh in geohashes:
-        lat, lon, _, _ = geohash2.decode_exactly(gh)
-        rows.append({"geohash": gh, "lat": lat, "lon": lon})
-    df = pd.DataFrame(rows)
-    return df.to_csv(index=False)
+from karta.boundaries import open_boundaries
+from karta.cover_store import open_store
+from karta.export import geohash_csv, geojson_buffer
+from karta.geohash_set import compact
+from karta.render import geohash_deck
+
+# Batas admin kolumnar, dimuat sekali per proses
+@st.cache_resource(show_spinner=False)
+def get_boundary_store(boundary_file, field, file_mtime):
+    return open_boundaries(boundary_file, field)
+
+# Cover GeoHash prakomputasi per wilayah (dibangun ulang jika file batas berubah)
+@st.cache_resource(show_spinner="⏳ Processing GeoHash...")
+def get_cover_store(boundary_file, field, file_mtime):
+    return open_store(boundary_file, field)
+
+# Fungsi GeoHash ke GeoJSON (dict, untuk layer folium)
+def geohash6_to_geojson(codes, precision=6):
+    return json.loads(geojson_buffer(codes, precision).getvalue())
 
 # Setup
 st.set_page_config(layout="wide")
 st.title("🗺️ Download GeoHash")
 
+# Mode peta: WebGL (pydeck) untuk cover besar, Folium untuk tampilan lama
+render_mode = st.radio("🗺️ Map mode:", ["WebGL (pydeck)", "Folium"], horizontal=True)
+use_pydeck = render_mode == "WebGL (pydeck)"
+
 # Siapkan default map
 m = folium.Map(location=[-2.5, 117.5], zoom_start=5)
+deck, _ = geohash_deck([])
 
 # File kabupaten dan provinsi
 kab_file = "pages/batas_admin_kabupaten.geojson"
 prov_file = "pages/batas_admin_provinsi.geojson"
 
-# Load GeoJSON
-kab_geojson, prov_geojson = None, None
+# Load daftar wilayah (hanya metadata, geometri dibaca saat dipilih)
+kab_store, prov_store = None, None
 
 if os.path.exists(kab_file):
-    with open(kab_file, "r", encoding="utf-8") as f:
-        kab_geojson = json.load(f)
+    kab_store = get_boundary_store(kab_file, "WADMKK", os.path.getmtime(kab_file))
 else:
     st.error("❌ File 'batas_admin_kabupaten.geojson' tidak ditemukan")
 
 if os.path.exists(prov_file):
-    with open(prov_file, "r", encoding="utf-8") as f:
-        prov_geojson = json.load(f)
+    prov_store = get_boundary_store(prov_file, "PROVINSI", os.path.getmtime(prov_file))
 else:
     st.error("❌ File 'batas_admin_provinsi.geojson' tidak ditemukan")
 
@@ -131,14 +63,14 @@ col1, col2, col3 = st.columns([5, 5, 1.5])
 
 with col1:
     selected_kabupaten = None
-    if kab_geojson:
-        kabupaten_list = sorted({f["properties"].get("WADMKK") for f in kab_geojson["features"] if f["properties"].get("WADMKK")})
+    if kab_store:
+        kabupaten_list = kab_store.names
         selected_kabupaten = st.selectbox("🏙️ Select Regency:", ["-- Select Regency --"] + kabupaten_list)
 
 with col2:
     selected_provinsi = None
-    if prov_geojson:
-        provinsi_list = sorted({f["properties"].get("PROVINSI") for f in prov_geojson["features"] if f["properties"].get("PROVINSI")})
+    if prov_store:
+        provinsi_list = prov_store.names
         selected_provinsi = st.selectbox("🏞️ Select Province:", ["-- Select Province --"] + provinsi_list)
 
 with col3:
@@ -158,66 +90,84 @@ with col3:
 if st.session_state.has_searched:
     selected_geojson = None
     layer_name = ""
+    region_store = None
 
     if st.session_state.selected_kabupaten:
-        filtered_kab = [
-            f for f in kab_geojson["features"]
-            if f["properties"].get("WADMKK") == st.session_state.selected_kabupaten
-        ]
-        selected_geojson = {"type": "FeatureCollection", "features": filtered_kab}
         layer_name = st.session_state.selected_kabupaten
-        if filtered_kab:
-            m.fit_bounds(get_bounds_from_geojson(selected_geojson))
+        region_store, store_key = kab_store, (kab_file, "WADMKK")
 
     elif st.session_state.selected_provinsi:
-        filtered_prov = [
-            f for f in prov_geojson["features"]
-            if f["properties"].get("PROVINSI") == st.session_state.selected_provinsi
-        ]
-        selected_geojson = {"type": "FeatureCollection", "features": filtered_prov}
         layer_name = st.session_state.selected_provinsi
-        if filtered_prov:
-            m.fit_bounds(get_bounds_from_geojson(selected_geojson))
+        region_store, store_key = prov_store, (prov_file, "PROVINSI")
+
+    if layer_name and region_store and layer_name in region_store:
+        selected_geojson = region_store.geojson(layer_name)
+        minx, miny, maxx, maxy = region_store.bounds(layer_name)
+        m.fit_bounds([[miny, minx], [maxy, maxx]])
 
     st.session_state.geojson_result = selected_geojson
 
     if selected_geojson:
         name = layer_name.replace(" ", "_").lower()
 
-        # Generate GeoHash
-        geohashes = geojson_to_geohash6(selected_geojson)
-        geohash_geojson = geohash6_to_geojson(geohashes)
+        # Ambil GeoHash dari cover prakomputasi
+        boundary_file, field = store_key
+        store = get_cover_store(boundary_file, field, os.path.getmtime(boundary_file))
+        codes = store.codes(layer_name)
 
         # ✅ Tampilkan hanya GeoHash di peta
-        folium.GeoJson(
-            geohash_geojson,
-            name="GeoHash6",
-            style_function=lambda x: {"color": "#ff6600", "weight": 1, "fillOpacity": 0.3}
-        ).add_to(m)
+        if use_pydeck:
+            deck, map_precision = geohash_deck(codes, bounds=(minx, miny, maxx, maxy))
+            if map_precision < 6:
+                st.caption(f"ℹ️ {len(codes):,} GeoHash6 ditampilkan sebagai GeoHash{map_precision} agar peta tetap ringan.")
+        else:
+            folium.GeoJson(
+                geohash6_to_geojson(codes, store.precision),
+                name="GeoHash6",
+                style_function=lambda x: {"color": "#ff6600", "weight": 1, "fillOpacity": 0.3}
+            ).add_to(m)
 
         # === Tombol download
+        compact_output = st.checkbox(
+            "🗜️ Compact output (gabungkan 32 sel saudara menjadi sel induk, presisi campuran)"
+        )
+        if compact_output:
+            out_codes, out_precision = compact(codes, store.precision)
+            suffix = "geohash_compact"
+            # Label mengikuti presisi keluaran, mis. "GeoHash4–6" untuk presisi campuran
+            lo, hi = (int(np.min(out_precision)), int(np.max(out_precision))) if len(out_codes) \
+                else (store.precision, store.precision)
+            out_label = f"GeoHash{lo}" if lo == hi else f"GeoHash{lo}–{hi}"
+            st.caption(f"ℹ️ {len(codes):,} GeoHash6 → {len(out_codes):,} sel presisi campuran.")
+        else:
+            out_codes, out_precision = codes, store.precision
+            suffix = f"geohash{store.precision}"
+            out_label = f"GeoHash{store.precision}"
+
         col1, col2 = st.columns([5, 5])
         with col1:
-            # Download geohash
-            geohash_str = json.dumps(geohash_geojson, ensure_ascii=False, indent=2)
+            # Download geohash (GeoJSON tanpa indentasi, ditulis bertahap)
             st.download_button(
-                label="📥 Download GeoHash6",
-                data=geohash_str,
-                file_name=f"{name}_geohash6.geojson",
+                label=f"📥 Download {out_label}",
+                data=geojson_buffer(out_codes, out_precision),
+                file_name=f"{name}_{suffix}.geojson",
                 mime="application/geo+json"
             )
         with col2:
-            geohash_csv = geohash_to_csv(geohashes)
+            geohash_csv_text = geohash_csv(out_codes, out_precision)
             st.download_button(
-                label="📄 Download GeoHash6 CSV",
-                data=geohash_csv,
-                file_name=f"{name}_geohash6.csv",
+                label=f"📄 Download {out_label} CSV",
+                data=geohash_csv_text,
+                file_name=f"{name}_{suffix}.csv",
                 mime="text/csv"
             )
 
 
 # Tampilkan map
-st_data = st_folium(m, width=1200, height=600)
+if use_pydeck:
+    st.pydeck_chart(deck, height=600)
+else:
+    st_data = st_folium(m, width=1200, height=600)
 
 # Footer
 st.markdown(
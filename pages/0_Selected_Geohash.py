@@ -1,112 +1,82 @@
 import streamlit as st
 import geopandas as gpd
-import pandas as pd
-import osmnx as ox
-import geohash2
-from shapely.geometry import Polygon
+import numpy as np
+import os
+import hashlib
 from io import BytesIO
-from collections import Counter
+from karta import codec
+from karta.density import ROAD_CLASSES, density_scores, raw_counts, select_dense
+from karta.osm_cache import TileCache
+from karta.osm_local import DEFAULT_EXTRACT, extract_keys, read_features
 
-if "result_gdf" not in st.session_state:
-    st.session_state["result_gdf"] = None
-if "download_ready" not in st.session_state:
-    st.session_state["download_ready"] = False
+if "extraction" not in st.session_state:
+    st.session_state["extraction"] = None
 
 
-def select_dense_geohash_from_uploaded_boundary(
-    file, 
-    tag_filters, 
-    top_percent=0.5,
-    precision=6  # Default geohash6
-):
-    boundary_gdf = gpd.read_file(file).to_crs("EPSG:4326")
+# Cache tile OSM di disk, dipakai bersama halaman Calculate Target UKM
+@st.cache_resource(show_spinner=False)
+def get_tile_cache():
+    return TileCache()
+
+
+def boundary_key(data):
+    """Hash konten file batas; kunci semua cache tahap di bawah."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+# Tahap 1: unduh POI dan jalan besar (di-cache per konten batas + tag + sumber)
+@st.cache_data(show_spinner="📡 Fetching POI data and major roads...", max_entries=16)
+def fetch_osm_features(key, _boundary_bytes, tag_filters, osm_extract=None):
+    boundary_gdf = gpd.read_file(BytesIO(_boundary_bytes)).to_crs("EPSG:4326")
     polygon = boundary_gdf.unary_union
 
-    st.info("📡 Fetching POI data...")
+    def fetch_features(tags):
+        if osm_extract:
+            return read_features(osm_extract, polygon, tags)
+        return get_tile_cache().features_from_polygon(polygon, tags)
+
+    # Error sengaja tidak ditangkap di sini: st.cache_data tidak menyimpan hasil yang gagal
     tags_dict = {tag: True for tag in tag_filters}
-    try:
-        poi_gdf = ox.features_from_polygon(polygon, tags=tags_dict)
-        poi_gdf = poi_gdf[poi_gdf.geometry.type.isin(['Point', 'Polygon', 'MultiPolygon'])]
-        poi_gdf = poi_gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        st.warning(f"⚠️ Gagal mengambil POI: {e}")
-        poi_gdf = gpd.GeoDataFrame(columns=['geometry'], geometry='geometry', crs='EPSG:4326')
+    poi_gdf = fetch_features(tags_dict)
+    poi_gdf = poi_gdf[poi_gdf.geometry.type.isin(['Point', 'Polygon', 'MultiPolygon'])]
+    poi_gdf = poi_gdf[[t for t in tag_filters if t in poi_gdf.columns] + ['geometry']].to_crs("EPSG:4326")
 
-    st.info("🚗 Fetching major roads...")
-    try:
-        road_tags = {'highway': ['motorway', 'trunk', 'primary', 'secondary']}
-        roads_gdf = ox.features_from_polygon(polygon, tags=road_tags)
-        roads_gdf = roads_gdf[roads_gdf.geometry.type.isin(['LineString', 'MultiLineString'])]
-        roads_gdf = roads_gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        st.warning(f"⚠️ Gagal mengambil jalan besar: {e}")
-        roads_gdf = gpd.GeoDataFrame(columns=['geometry'], geometry='geometry', crs='EPSG:4326')
+    road_tags = {'highway': list(ROAD_CLASSES)}
+    roads_gdf = fetch_features(road_tags)
+    roads_gdf = roads_gdf[roads_gdf.geometry.type.isin(['LineString', 'MultiLineString'])]
+    # Batas tanpa jalan besar menghasilkan frame tanpa kolom highway; POI tetap dipakai
+    roads_gdf = roads_gdf.reindex(columns=['highway', 'geometry']).to_crs("EPSG:4326")
 
-    all_gdf = pd.concat([poi_gdf, roads_gdf], ignore_index=True)
-    if all_gdf.empty:
-        st.error("❌ Tidak ada data POI atau jalan.")
-        return None
-
-    def encode_geohash(geom):
-        try:
-            if geom.is_empty:
-                return None
-            if geom.geom_type == 'Point':
-                point = geom
-            else:
-                point = geom.representative_point()
-            return geohash2.encode(point.y, point.x, precision=precision)
-        except:
-            return None
-
-    all_gdf['geohash'] = all_gdf.geometry.apply(encode_geohash)
-    all_gdf = all_gdf.dropna(subset=['geohash'])
-    all_gdf = all_gdf[all_gdf['geohash'].apply(lambda x: isinstance(x, str))]
-
-    count_df = all_gdf.groupby('geohash').size().reset_index(name='count')
-    threshold = count_df['count'].quantile(1 - top_percent)
-    dense_df = count_df[count_df['count'] >= threshold]
-
-    def add_missing_centers(df):
-        all_neighbors = []
-        for gh in df['geohash']:
-            try:
-                nbs = geohash2.neighbors(gh)
-                all_neighbors.extend(nbs)
-            except:
-                continue
-        freq = Counter(all_neighbors)
-        missing = [g for g in freq if g not in df['geohash'].values and freq[g] >= 2]
-        df_extra = count_df[count_df['geohash'].isin(missing)]
-        return pd.concat([df, df_extra], ignore_index=True)
-
-    dense_df = add_missing_centers(dense_df)
-
-    def geohash_to_polygon(g):
-        lat, lon, lat_err, lon_err = geohash2.decode_exactly(g)
-        return Polygon([
-            (lon - lon_err, lat - lat_err),
-            (lon - lon_err, lat + lat_err),
-            (lon + lon_err, lat + lat_err),
-            (lon + lon_err, lat - lat_err),
-            (lon - lon_err, lat - lat_err)
-        ])
-
-    dense_gdf = gpd.GeoDataFrame({
-        'geoHash': dense_df['geohash'],
-        'count': dense_df['count'],
-        'geometry': dense_df['geohash'].apply(geohash_to_polygon)
-    }, crs='EPSG:4326')
+    return poi_gdf, roads_gdf
+
+
+# Tahap 2: tabel hitungan mentah per geohash, per tag dan kelas jalan
+@st.cache_data(show_spinner="🧮 Counting features per geohash...", max_entries=32)
+def density_table(key, _boundary_bytes, tag_filters, osm_extract=None, precision=6):
+    poi_gdf, roads_gdf = fetch_osm_features(key, _boundary_bytes, tag_filters, osm_extract)
+    return raw_counts(poi_gdf, roads_gdf, tag_filters, precision)
 
-    st.info("🧹 Menghapus outlier geohash yang jauh...")
-    dense_union = dense_gdf.unary_union
-    if dense_union.geom_type == 'MultiPolygon':
-        largest = max(dense_union.geoms, key=lambda g: g.area)
-    else:
-        largest = dense_union
-    dense_gdf = dense_gdf[dense_gdf.geometry.intersects(largest)]
 
-    return dense_gdf
+# Tahap 3: seleksi dari tabel hitungan (tanpa geometri, cukup cepat untuk tiap rerun)
+def select_dense_geohash(table, weights, top_percent=0.5, precision=6, min_neighbors=2,
+                         connectivity=8, top_clusters=1):
+    codes = table.index.to_numpy(dtype=np.uint64)
+    scores = density_scores(table, weights)
+    mask, labels = select_dense(
+        codes, scores, precision,
+        top_percent=top_percent,
+        min_neighbors=min_neighbors,
+        connectivity=connectivity,
+        top_clusters=top_clusters
+    )
+    codes = codes[mask]
+    return gpd.GeoDataFrame({
+        'geoHash': codec.to_str(codes, precision),
+        'count': table.to_numpy()[mask].sum(axis=1),
+        'score': scores[mask],
+        'cluster': labels[mask],
+        'geometry': codec.boxes(codec.bounds_int(codes, precision))
+    }, crs='EPSG:4326')
 
 # ================================
 # STREAMLIT APP UI STARTS HERE
@@ -115,35 +85,80 @@ def select_dense_geohash_from_uploaded_boundary(
 st.title("🧭 Select Dense Geohash (Fixed Geohash6)")
 
 uploaded_file = st.file_uploader("📁 Upload GeoJSON Boundary", type=["geojson", "json"])
-top_percent = 0.5  # Fixed value
-
-default_tags = ['building', 'commercial']
-
-if uploaded_file and st.button("🚀 Run Extraction"):
-    st.session_state.download_ready = False  # Reset download status
-    result_gdf = select_dense_geohash_from_uploaded_boundary(
-        uploaded_file,
-        tag_filters=default_tags,
-        top_percent=top_percent,
-        precision=6
-    )
 
-    if result_gdf is not None:
-        st.session_state.result_gdf = result_gdf
-        st.session_state.download_ready = True
-        st.success("✅ Geohash padat berhasil diekstrak.")
-
-# Menampilkan tabel dan tombol download hanya jika sudah ada hasil
-if st.session_state.download_ready and st.session_state.result_gdf is not None:
-    st.dataframe(st.session_state.result_gdf[['geoHash', 'count']])
-
-    buffer = BytesIO()
-    st.session_state.result_gdf.to_file(buffer, driver="GeoJSON")
-    buffer.seek(0)
+data_source = st.radio("🗄️ Data source:", ["Overpass (online)", "Local OSM extract"], horizontal=True)
+osm_extract = None
+if data_source == "Local OSM extract":
+    osm_extract = st.text_input("📂 OSM extract (.osm.pbf or converted .parquet)", value=str(DEFAULT_EXTRACT))
+    if not os.path.exists(osm_extract):
+        st.error(f"❌ File ekstrak OSM tidak ditemukan: {osm_extract}")
+
+# Ekstrak kolumnar hanya memuat kunci tag tertentu; tawarkan yang benar-benar ada
+tag_options = ['building', 'commercial', 'amenity', 'shop', 'office']
+if osm_extract and os.path.exists(osm_extract):
+    available = extract_keys(osm_extract)
+    if available is not None:
+        tag_options = [tag for tag in tag_options if tag in available]
+default_tags = [tag for tag in ['building', 'commercial'] if tag in tag_options]
+tag_filters = st.multiselect("🏷️ POI tags:", tag_options, default=default_tags)
+if not tag_filters:
+    st.info("ℹ️ Pilih minimal satu tag POI.")
+
+if uploaded_file and st.button("🚀 Run Extraction", disabled=not tag_filters):
+    boundary_bytes = uploaded_file.getvalue()
+    st.session_state.extraction = {
+        'key': boundary_key(boundary_bytes),
+        'bytes': boundary_bytes,
+        'tags': tuple(tag_filters),
+        'osm_extract': osm_extract,
+    }
+
+# Parameter seleksi dihitung ulang dari tabel hitungan yang di-cache, tanpa unduh ulang
+extraction = st.session_state.extraction
+if extraction is not None:
+    try:
+        table = density_table(
+            extraction['key'], extraction['bytes'], extraction['tags'], extraction['osm_extract'], precision=6
+        )
+    except Exception as e:
+        # Tidak di-cache: rerun berikutnya mencoba mengambil ulang
+        st.warning(f"⚠️ Gagal mengambil data OSM: {e}")
+        table = None
 
-    st.download_button(
-        label="💾 Download Selected Geohash (GeoJSON)",
-        data=buffer,
-        file_name="dense_osm_geohash.geojson",
-        mime="application/geo+json"
-    )
+    if table is not None and table.empty:
+        st.error("❌ Tidak ada data POI atau jalan.")
+    elif table is not None:
+        with st.expander("⚙️ Selection parameters", expanded=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                top_percent = st.slider("📊 Top percent (quantile)", 0.05, 1.0, 0.5, step=0.05)
+                min_neighbors = st.slider("🧩 Fill holes: min dense neighbours (0 = off)", 0, 8, 2)
+                top_clusters = st.number_input("🗺️ Keep largest clusters", min_value=1, value=1, step=1)
+            with col2:
+                weights = {
+                    column: st.number_input(f"⚖️ Weight {column}", min_value=0.0, value=1.0, step=0.5)
+                    for column in table.columns
+                }
+
+        result_gdf = select_dense_geohash(
+            table,
+            weights,
+            top_percent=top_percent,
+            precision=6,
+            min_neighbors=min_neighbors,
+            top_clusters=int(top_clusters)
+        )
+
+        st.success(f"✅ {len(result_gdf):,} geohash padat dari {len(table):,} geohash berisi data.")
+        st.dataframe(result_gdf[['geoHash', 'count', 'score', 'cluster']])
+
+        buffer = BytesIO()
+        result_gdf.to_file(buffer, driver="GeoJSON")
+        buffer.seek(0)
+
+        st.download_button(
+            label="💾 Download Selected Geohash (GeoJSON)",
+            data=buffer,
+            file_name="dense_osm_geohash.geojson",
+            mime="application/geo+json"
+        )
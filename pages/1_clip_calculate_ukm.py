@@ -1,48 +1,120 @@
 import streamlit as st
 import geopandas as gpd
-from shapely.geometry import LineString, MultiLineString
+import numpy as np
+import pandas as pd
 from io import BytesIO
 import os
+import tempfile
+from karta import codec
+from karta.export import download_bytes, iter_features
+from karta.geodesy import geodesic_length
+from karta.road_lengths import open_lengths
+from karta.road_store import open_roads
+from karta.road_stream import MEMORY_BUDGET, iter_clipped
 
-def clip_roads_by_geohash_from_local(uploaded_geohash_file, roads_path="pages/road_data.geojson"):
+# Store jalan terindeks, dibangun sekali dan dibangun ulang jika file jalan berubah
+@st.cache_resource(show_spinner="🛣️ Mengindeks file jalan lokal...")
+def get_road_store(roads_path, file_mtime):
+    return open_roads(roads_path)
+
+# Tabel panjang jalan per geohash6 dan kelas jalan (diperbarui inkremental jika file jalan berubah)
+@st.cache_resource(show_spinner="📏 Memperbarui tabel panjang jalan per geohash...")
+def get_length_table(roads_path, file_mtime):
+    return open_lengths(roads_path)
+
+def clip_roads_streaming(geohashes, cell_bounds, roads_path, budget):
+    """Clip per batch file jalan (tanpa indeks), memori dibatasi ``budget`` byte."""
+    lengths = np.zeros(len(geohashes))
+    status = st.empty()
+    n_pieces = 0
+
+    def chunks():
+        nonlocal n_pieces
+        for pieces in iter_clipped(roads_path, cell_bounds, budget, columns=[]):
+            cells = pieces['cell'].to_numpy()
+            lengths[:] += np.bincount(cells, weights=pieces['length_m'].to_numpy(), minlength=len(geohashes))
+            n_pieces += len(pieces)
+            status.text(f"🌊 {n_pieces:,} potongan jalan diproses...")
+            yield pieces.assign(geohash=geohashes[cells], length_km=pieces['length_m'] / 1000)[
+                ['geohash', 'length_km', 'geometry']
+            ]
+
+    # Fitur ditulis bertahap; file hasil pindah ke disk bila melebihi separuh budget
+    output = tempfile.SpooledTemporaryFile(max_size=budget // 2)
+    for part in iter_features(chunks()):
+        output.write(part)
+
+    summary = pd.DataFrame({'geohash': geohashes, 'length_km': lengths / 1000})
+    return summary[summary['length_km'] > 0].reset_index(drop=True), output, n_pieces
+
+def clip_roads_by_geohash_from_local(uploaded_geohash_file, roads_path="pages/road_data.geojson",
+                                     streaming=False, budget=MEMORY_BUDGET):
     st.info("📥 Membaca file geohash yang diupload...")
-    geohash_gdf = gpd.read_file(uploaded_geohash_file).to_crs("EPSG:4326")
+    geohash_gdf = gpd.read_file(uploaded_geohash_file)
+    geohash_col = next((c for c in ('geohash', 'geoHash') if c in geohash_gdf.columns), None)
+    if geohash_col is None:
+        st.error("⚠️ Kolom 'geohash' tidak ditemukan di file geohash.")
+        return
+    geohashes = geohash_gdf[geohash_col].dropna().astype(str).str.strip().unique()
+    try:
+        cell_bounds = codec.bounds(geohashes)
+    except ValueError as e:
+        st.error(f"❌ Geohash tidak valid: {e}")
+        return
 
     st.info("🛣️ Membaca file jalan lokal...")
     if not os.path.exists(roads_path):
         st.error(f"❌ File jalan tidak ditemukan di path: {roads_path}")
         return
 
-    roads_gdf = gpd.read_file(roads_path).to_crs("EPSG:4326")
-    roads_gdf = roads_gdf[roads_gdf.geometry.type.isin(['LineString', 'MultiLineString'])]
+    if streaming:
+        st.info("🌊 Clip bertahap per batch file jalan...")
+        summary, output, n_pieces = clip_roads_streaming(geohashes, cell_bounds, roads_path, budget)
+        if n_pieces == 0:
+            st.warning("🚫 Tidak ada jalan yang terklip dengan geohash.")
+            return
+        st.info(f"🧮 Total panjang jalan: **{summary['length_km'].sum():.2f} km**")
+        st.dataframe(summary, use_container_width=True)
+        st.download_button(
+            label="💾 Download Jalan Terklip per Geohash",
+            data=download_bytes(output),
+            file_name="clipped_roads_by_geohash.geojson",
+            mime="application/geo+json"
+        )
+        return
+
+    road_store = get_road_store(roads_path, os.path.getmtime(roads_path))
+
+    # GeoHash6 dijawab langsung dari tabel prakomputasi (join, tanpa geometri)
+    summary = None
+    if all(len(gh) == 6 for gh in geohashes):
+        summary = get_length_table(roads_path, os.path.getmtime(roads_path)).frame(geohashes)
+        summary = summary[summary['total_km'] > 0].reset_index(drop=True)
+        st.info(f"🧮 Total panjang jalan: **{summary['total_km'].sum():.2f} km**")
+        st.dataframe(summary, use_container_width=True)
 
     st.info("✂️ Melakukan clip jalan berdasarkan geohash...")
-    clipped = gpd.overlay(roads_gdf, geohash_gdf, how='intersection')
+    # Sel geohash berupa persegi panjang: cukup baca blok jalan yang bbox-nya menyentuh sel, lalu clip_by_rect
+    clipped = road_store.clip(cell_bounds, columns=[])
 
     if clipped.empty:
         st.warning("🚫 Tidak ada jalan yang terklip dengan geohash.")
         return
 
     st.info("📏 Menghitung panjang jalan...")
-    clipped = clipped.to_crs("EPSG:3857")
-    clipped['length_m'] = clipped.geometry.length
-    clipped['length_km'] = clipped['length_m'] / 1000
+    clipped['geohash'] = geohashes[clipped['cell'].to_numpy()]
+    # Panjang geodesik (WGS84) langsung dari koordinat lon/lat, tanpa reproyeksi
+    clipped['length_km'] = geodesic_length(clipped.geometry.values) / 1000
 
-    # Pastikan kolom geohash ada setelah overlay (misalnya di kolom 'geohash')
-    if 'geohash' not in clipped.columns:
-        st.error("⚠️ Kolom 'geohash' tidak ditemukan di hasil overlay.")
-        return
+    result = clipped[['geohash', 'geometry', 'length_km']]
 
-    result = clipped[['geohash', 'geometry', 'length_km']].to_crs("EPSG:4326")
-
-    # Tampilkan tabel panjang jalan per geohash
-    summary = result.groupby('geohash')['length_km'].sum().reset_index()
-    st.dataframe(summary, use_container_width=True)
+    # Tampilkan tabel panjang jalan per geohash (jika belum dari tabel prakomputasi)
+    if summary is None:
+        summary = result.groupby('geohash')['length_km'].sum().reset_index()
+        st.dataframe(summary, use_container_width=True)
 
     # Tombol download GeoJSON hasil klip
-    buffer = BytesIO()
-    result.to_file(buffer, driver="GeoJSON")
-    buffer.seek(0)
+    buffer = BytesIO(b"".join(iter_features([result])))
     st.download_button(
         label="💾 Download Jalan Terklip per Geohash",
         data=buffer,
@@ -54,5 +126,16 @@ st.title("✂️ Clip Jalan dari File Lokal berdasarkan Geohash")
 
 geohash_file = st.file_uploader("📁 Upload GeoJSON Geohash (Polygon)", type=["geojson", "json"])
 
+# Mode streaming: baca file jalan per batch (tanpa konversi/indeks), untuk file sangat besar
+streaming = st.checkbox("🌊 Streaming mode (memori terbatas, tanpa indeks)")
+budget_mb = MEMORY_BUDGET >> 20
+if streaming:
+    budget_mb = st.number_input("💾 Memory budget (MB)", min_value=64, value=budget_mb, step=64)
+
 if geohash_file and st.button("🚀 Run Clipping"):
-    clip_roads_by_geohash_from_local(geohash_file, roads_path="pages/road_data.geojson")
+    clip_roads_by_geohash_from_local(
+        geohash_file,
+        roads_path="pages/road_data.geojson",
+        streaming=streaming,
+        budget=int(budget_mb) << 20
+    )
@@ -1,26 +1,9 @@
 # app.py
 import streamlit as st
-import pandas as pd
-import geohash2
-from shapely.geometry import Polygon
-import geopandas as gpd
-from io import StringIO
-import tempfile
+import hashlib
 import zipfile
-import os
-
-# Convert geohash to polygon
-def geohash_to_polygon(gh):
-    lat, lon, lat_err, lon_err = geohash2.decode_exactly(gh)
-    lat_min, lat_max = lat - lat_err, lat + lat_err
-    lon_min, lon_max = lon - lon_err, lon + lon_err
-    return Polygon([
-        (lon_min, lat_min),
-        (lon_min, lat_max),
-        (lon_max, lat_max),
-        (lon_max, lat_min),
-        (lon_min, lat_min)
-    ])
+from karta.convert import MissingColumnError, convert_batch, csv_to_geojson
+from karta.export import download_bytes
 
 st.title("CSV to GeoJSON Converter")
 st.markdown("Upload one or more CSV files containing a `geoHash` column. Each file will be converted to a GeoJSON with polygons.")
@@ -28,57 +11,54 @@ st.markdown("Upload one or more CSV files containing a `geoHash` column. Each fi
 uploaded_files = st.file_uploader("📄 Upload CSV files", type="csv", accept_multiple_files=True)
 
 if uploaded_files:
-    output_dir = tempfile.mkdtemp()
-    geojson_paths = []
-
-    for file in uploaded_files:
-        st.write(f"Processing: **{file.name}**")
-        df = pd.read_csv(file)
-
-        if 'geoHash' not in df.columns:
-            st.warning(f"Skipped `{file.name}` — missing 'geoHash' column.")
-            continue
-
-        try:
-            df['geometry'] = df['geoHash'].apply(geohash_to_polygon)
-            gdf = gpd.GeoDataFrame(df, geometry='geometry')
-            gdf.set_crs(epsg=4326, inplace=True)
-
-            geojson_name = file.name.replace(".csv", ".geojson")
-            geojson_path = os.path.join(output_dir, geojson_name)
-            gdf.to_file(geojson_path, driver='GeoJSON')
+    # Konversi hanya saat set file berubah; rerun (mis. klik download) memakai hasil tersimpan
+    upload_key = tuple((file.name, hashlib.sha256(file.getvalue()).hexdigest()[:16]) for file in uploaded_files)
+    result = st.session_state.get("csv_to_geojson")
+    if result is None or result["key"] != upload_key:
+        progress = st.progress(0.0, text=f"Converting {len(uploaded_files)} file(s)...")
 
-            geojson_paths.append(geojson_path)
-            st.success(f"✅ Converted: {geojson_name}")
+        # Dipanggil tiap kali satu file selesai dikonversi di process pool
+        def on_progress(done, total, name, error):
+            progress.progress(done / total, text=f"Processed {done}/{total}: {name}")
 
-        except Exception as e:
-            st.error(f"Error processing `{file.name}`: {e}")
+        # Hasil langsung masuk ke ZIP (di memori / spooled), tanpa folder sementara yang tertinggal
+        output, converted, errors = convert_batch(
+            [(file.name, file) for file in uploaded_files], csv_to_geojson, ".geojson", on_progress=on_progress
+        )
+        with output:
+            if len(converted) == 1:
+                # Single file: Download directly
+                with zipfile.ZipFile(output) as archive:
+                    data = archive.read(converted[0][1])
+            else:
+                data = download_bytes(output)
+        result = {"key": upload_key, "converted": converted, "errors": errors, "data": data}
+        st.session_state["csv_to_geojson"] = result
 
-    if len(geojson_paths) == 1:
-        # Single file: Download directly
-        geojson_path = geojson_paths[0]
-        with open(geojson_path, "rb") as f:
-            st.download_button(
-                label="⬇️ Download GeoJSON",
-                data=f,
-                file_name=os.path.basename(geojson_path),
-                mime="application/geo+json"
-            )
+    for name, _ in result["converted"]:
+        st.success(f"✅ Converted: {name}")
+    for name, error in result["errors"]:
+        if isinstance(error, MissingColumnError):
+            st.warning(f"Skipped `{name}` — missing 'geoHash' column.")
+        else:
+            st.error(f"Error processing `{name}`: {error}")
 
-    elif len(geojson_paths) > 1:
-        # Multiple files: Zip and download
-        zip_path = os.path.join(output_dir, "converted_geojsons.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for geojson_file in geojson_paths:
-                zipf.write(geojson_file, os.path.basename(geojson_file))
+    if len(result["converted"]) == 1:
+        st.download_button(
+            label="⬇️ Download GeoJSON",
+            data=result["data"],
+            file_name=result["converted"][0][1],
+            mime="application/geo+json"
+        )
 
-        with open(zip_path, "rb") as f:
-            st.download_button(
-                label="📦 Download All GeoJSONs as ZIP",
-                data=f,
-                file_name="geojson_output.zip",
-                mime="application/zip"
-            )
+    elif len(result["converted"]) > 1:
+        # Multiple files: Download the ZIP
+        st.download_button(
+            label="📦 Download All GeoJSONs as ZIP",
+            data=result["data"],
+            file_name="geojson_output.zip",
+            mime="application/zip"
+        )
 
 # Footer
 st.markdown(
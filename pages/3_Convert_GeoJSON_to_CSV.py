@@ -1,10 +1,9 @@
 # app.py
 import streamlit as st
-import pandas as pd
-import geopandas as gpd
-import tempfile
+import hashlib
 import zipfile
-import os
+from karta.convert import convert_batch, geojson_to_csv
+from karta.export import download_bytes
 
 st.title("GeoJSON to CSV Converter")
 st.markdown("Upload one or more GeoJSON files. Each file will be converted to a CSV with geometry coordinates.")
@@ -12,51 +11,51 @@ st.markdown("Upload one or more GeoJSON files. Each file will be converted to a
 uploaded_files = st.file_uploader("📄 Upload GeoJSON files", type="geojson", accept_multiple_files=True)
 
 if uploaded_files:
-    output_dir = tempfile.mkdtemp()
-    csv_paths = []
+    # Konversi hanya saat set file berubah; rerun (mis. klik download) memakai hasil tersimpan
+    upload_key = tuple((file.name, hashlib.sha256(file.getvalue()).hexdigest()[:16]) for file in uploaded_files)
+    result = st.session_state.get("geojson_to_csv")
+    if result is None or result["key"] != upload_key:
+        progress = st.progress(0.0, text=f"Converting {len(uploaded_files)} file(s)...")
 
-    for file in uploaded_files:
-        st.write(f"Processing: **{file.name}**")
-        try:
-            gdf = gpd.read_file(file)
+        # Dipanggil tiap kali satu file selesai dikonversi di process pool
+        def on_progress(done, total, name, error):
+            progress.progress(done / total, text=f"Processed {done}/{total}: {name}")
 
-            # Flatten geometry to WKT or GeoJSON string
-            gdf['geometry'] = gdf['geometry'].apply(lambda geom: geom.wkt)
+        # Hasil langsung masuk ke ZIP (di memori / spooled), tanpa folder sementara yang tertinggal
+        output, converted, errors = convert_batch(
+            [(file.name, file) for file in uploaded_files], geojson_to_csv, ".csv", on_progress=on_progress
+        )
+        with output:
+            if len(converted) == 1:
+                # Single file: Download directly
+                with zipfile.ZipFile(output) as archive:
+                    data = archive.read(converted[0][1])
+            else:
+                data = download_bytes(output)
+        result = {"key": upload_key, "converted": converted, "errors": errors, "data": data}
+        st.session_state["geojson_to_csv"] = result
 
-            csv_name = file.name.replace(".geojson", ".csv")
-            csv_path = os.path.join(output_dir, csv_name)
-            gdf.to_csv(csv_path, index=False)
+    for name, _ in result["converted"]:
+        st.success(f"✅ Converted: {name}")
+    for name, error in result["errors"]:
+        st.error(f"Error processing `{name}`: {error}")
 
-            csv_paths.append(csv_path)
-            st.success(f"✅ Converted: {csv_name}")
-        except Exception as e:
-            st.error(f"Error processing `{file.name}`: {e}")
+    if len(result["converted"]) == 1:
+        st.download_button(
+            label="⬇️ Download CSV",
+            data=result["data"],
+            file_name=result["converted"][0][1],
+            mime="text/csv"
+        )
 
-    if len(csv_paths) == 1:
-        # Single file: Download directly
-        csv_path = csv_paths[0]
-        with open(csv_path, "rb") as f:
-            st.download_button(
-                label="⬇️ Download CSV",
-                data=f,
-                file_name=os.path.basename(csv_path),
-                mime="text/csv"
-            )
-
-    elif len(csv_paths) > 1:
-        # Multiple files: Zip and download
-        zip_path = os.path.join(output_dir, "converted_csvs.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for csv_file in csv_paths:
-                zipf.write(csv_file, os.path.basename(csv_file))
-
-        with open(zip_path, "rb") as f:
-            st.download_button(
-                label="📦 Download All CSVs as ZIP",
-                data=f,
-                file_name="csv_output.zip",
-                mime="application/zip"
-            )
+    elif len(result["converted"]) > 1:
+        # Multiple files: Download the ZIP
+        st.download_button(
+            label="📦 Download All CSVs as ZIP",
+            data=result["data"],
+            file_name="csv_output.zip",
+            mime="application/zip"
+        )
 
 # Footer
 st.markdown(
@@ -1,10 +1,17 @@
 import streamlit as st
-import osmnx as ox
 import geopandas as gpd
 import pandas as pd
 import io
-import geohash2
-from shapely.geometry import box
+import numpy as np
+import os
+from karta import codec
+from karta.fetch_engine import RETRIES, WORKERS
+from karta.fetch_plan import clip_to_cells
+from karta.geodesy import geodesic_length
+from karta.geohash_set import expand
+from karta.osm_cache import TileCache, overpass_rate
+from karta.road_lengths import open_lengths
+from karta.rollup import open_cube, open_regions, region_names
 
 st.set_page_config(page_title="🛣️ Calculate Target UKM", layout="wide")
 st.title("🛣️ Calculate Target UKM")
@@ -14,46 +21,115 @@ uploaded_file = st.file_uploader("📄 Upload GeoJSON or CSV with `geoHash` colu
 # Reset hasil roads saat tombol calculate ditekan
 if 'gdf_roads' not in st.session_state:
     st.session_state['gdf_roads'] = None
-
-def geohash_to_bounds(gh):
-    lat, lon, lat_err, lon_err = geohash2.decode_exactly(gh)
-    return (lat - lat_err, lat + lat_err, lon - lon_err, lon + lon_err)
-
-@st.cache_data(show_spinner="📡 Downloading roads...", ttl=3600)
-def download_clipped_roads_from_geohashes(geohash_list):
-    roads = []
-    tags = {
-        "highway": [
-            "motorway", "motorway_link", "secondary", "secondary_link",
-            "primary", "primary_link", "residential", "trunk", "trunk_link",
-            "tertiary", "tertiary_link", "living_street", "service", "unclassified"
-        ]
-    }
-
-    progress = st.progress(0)
-    for i, gh in enumerate(geohash_list):
-        try:
-            south, north, west, east = geohash_to_bounds(gh)
-            polygon = box(west, south, east, north)
-
-            gdf_all = ox.features_from_bbox(north, south, east, west, tags=tags)
-            gdf_lines = gdf_all[gdf_all.geometry.type.isin(["LineString", "MultiLineString"])]
-            gdf_clipped = gpd.clip(gdf_lines, polygon)
-
-            if not gdf_clipped.empty:
-                roads.append(gdf_clipped)
-        except Exception:
-            pass
-
-        progress.progress((i + 1) / len(geohash_list))
-
-    if roads:
-        return pd.concat(roads).reset_index(drop=True)
+if 'failed_cells' not in st.session_state:
+    st.session_state['failed_cells'] = {}
+if 'length_summary' not in st.session_state:
+    st.session_state['length_summary'] = None
+
+ROADS_PATH = "pages/road_data.geojson"
+
+ROAD_TAGS = {
+    "highway": [
+        "motorway", "motorway_link", "secondary", "secondary_link",
+        "primary", "primary_link", "residential", "trunk", "trunk_link",
+        "tertiary", "tertiary_link", "living_street", "service", "unclassified"
+    ]
+}
+
+# Cache tile OSM di disk, dipakai bersama halaman Select Dense Geohash
+@st.cache_resource(show_spinner=False)
+def get_tile_cache():
+    return TileCache()
+
+def download_clipped_roads_from_geohashes(geohash_list, cache, workers=WORKERS, retries=RETRIES):
+    """Jalan terpotong per sel, plus ``{geohash: error}`` untuk sel yang gagal diunduh."""
+    progress = st.progress(0.0, text="📡 Downloading roads...")
+
+    def on_progress(done, total):
+        progress.progress(done / total, text=f"📡 Downloading roads... {done}/{total} query")
+
+    # Ambil tile induk (dikelompokkan jadi beberapa kotak query, paralel), lalu potong per sel secara lokal
+    codes, _ = codec.to_int(geohash_list)
+    cell_tiles = codec.to_str(codes >> np.uint64(5 * (6 - cache.precision)), cache.precision)
+    tiles = np.unique(cell_tiles).tolist()
+    report = cache.prefetch(tiles, ROAD_TAGS, on_progress, workers=workers, retries=retries)
+    progress.progress(1.0, text="📡 Downloading roads... done")
+
+    failed = np.isin(cell_tiles, list(report.failed))
+    gdf_all = cache.load(sorted(set(tiles) - set(report.failed)), ROAD_TAGS)
+    gdf_lines = gdf_all[gdf_all.geometry.type.isin(["LineString", "MultiLineString"])]
+    failed_cells = {gh: report.failed[tile] for gh, tile in zip(np.asarray(geohash_list)[failed], cell_tiles[failed])}
+    gdf_roads = clip_to_cells(gdf_lines, codes[~failed], 6)
+    # Panjang geodesik (WGS84) langsung dari koordinat lon/lat, tanpa reproyeksi
+    gdf_roads['length_km'] = geodesic_length(gdf_roads.geometry.values) / 1000
+    return gdf_roads, failed_cells
+
+def to_geohash6(values):
+    """Geohash6 strings from uploaded cells; coarser (compacted) cells are expanded.
+
+    Returns ``(geohashes, n_expanded, n_invalid)`` so the caller can tell the
+    user about cells that were expanded or could not be used.
+    """
+    values = pd.Series(values).dropna().astype(str).str.strip().str.lower()
+    valid = values.str.fullmatch(f"[{codec.BASE32}]{{1,6}}")
+    strings = values[valid].unique()
+    codes, precisions = codec.to_int(strings)
+    # Output compact (presisi campuran) diperluas kembali ke sel anak geohash6
+    cells = expand(codes, precisions, 6)
+    return codec.to_str(cells, 6).tolist(), int((precisions < 6).sum()), int((~valid).sum())
+
+# Tabel panjang jalan per geohash6 dari file jalan lokal (diperbarui inkremental jika file berubah)
+@st.cache_resource(show_spinner="📏 Memperbarui tabel panjang jalan per geohash...")
+def get_length_table(roads_path, file_mtime):
+    return open_lengths(roads_path)
+
+# Cover dan batas wilayah untuk memetakan sel upload ke kabupaten/provinsi (juga sel tanpa jalan)
+@st.cache_resource(show_spinner="🗺️ Memuat batas wilayah...")
+def get_regions():
+    return open_regions()
+
+# Kubus rollup per prefix geohash dan wilayah admin (diperbarui dari selisih tabel panjang jalan)
+@st.cache_resource(show_spinner="🧊 Memperbarui rollup per level dan wilayah...")
+def get_rollup_cube(roads_path, file_mtime):
+    return open_cube(get_length_table(roads_path, file_mtime), regions=get_regions())
+
+ROLLUP_LEVELS = {"Geohash6": 6, "Geohash5": 5, "Geohash4": 4, "Kabupaten": "WADMKK", "Provinsi": "PROVINSI"}
+
+def rollup_summary(summary, cube, level, regions):
+    """Sum the per-geohash summary up to ``level`` next to the cube's full total for each key."""
+    codes, _ = codec.to_int(summary['geohash'].tolist())
+    if isinstance(level, int):
+        keys = summary['geohash'].str[:level]
+        # Satu searchsorted untuk semua prefix, bukan lookup per kunci
+        prefixes = codes >> np.uint64(5 * (cube.precision - level))
+        area_km = pd.Series(cube.lookup(prefixes, level).sum(axis=1) / 1000, index=summary.index)
     else:
-        return gpd.GeoDataFrame()
+        keys = pd.Series(region_names(codes, regions, level, cube.precision), index=summary.index)
+        keys = keys.fillna("(no region)")
+        area_km = keys.map(cube.region_frame(level).set_index('region')['total_km'])
+    keys = keys.rename('key')
+    rolled = summary.drop(columns='geohash').groupby(keys).sum()
+    rolled['area_total_km'] = area_km.groupby(keys).first()
+    rolled = rolled.reset_index()
+    return rolled.sort_values('total_km', ascending=False, ignore_index=True)
+
+road_source = st.radio("🗄️ Road source:", ["OSM (live download)", "Local road table"], horizontal=True)
+use_local_table = road_source == "Local road table"
+if use_local_table and not os.path.exists(ROADS_PATH):
+    st.error(f"❌ File jalan tidak ditemukan di path: {ROADS_PATH}")
+
+with st.expander("⚙️ Download settings"):
+    col1, col2 = st.columns(2)
+    workers = col1.number_input("Parallel queries", min_value=1, max_value=8, value=WORKERS)
+    retries = col2.number_input("Retries", min_value=0, max_value=10, value=RETRIES)
+    # Batas laju berlaku per endpoint untuk seluruh proses; diatur server, bukan per sesi
+    st.caption(f"⏱️ Max {overpass_rate():g} queries / second (server setting `KARTA_OVERPASS_RATE`).")
+cache = get_tile_cache()
 
 if uploaded_file and st.button("🗂️ Calculate UKM (GeoJSON)"):
     st.session_state['gdf_roads'] = None  # reset saat tombol calculate ditekan
+    st.session_state['failed_cells'] = {}
+    st.session_state['length_summary'] = None
     try:
         filename = uploaded_file.name.lower()
         if filename.endswith(".csv"):
@@ -71,37 +147,78 @@ if uploaded_file and st.button("🗂️ Calculate UKM (GeoJSON)"):
         if 'geoHash' not in df.columns:
             st.error("❌ File must contain a column named 'geoHash'")
         else:
-            geohash_list = df['geoHash'].dropna().astype(str).str.strip()
-            geohash_list = geohash_list[geohash_list.str.len() == 6].unique().tolist()
+            geohash_list, n_expanded, n_invalid = to_geohash6(df['geoHash'])
+            if n_expanded:
+                st.info(f"ℹ️ {n_expanded:,} coarser geohashes (compact output) expanded to geohash6.")
+            if n_invalid:
+                st.warning(f"⚠️ {n_invalid:,} values skipped: not a geohash of 1–6 characters.")
 
             if not geohash_list:
-                st.warning("⚠️ No valid 6-character geohashes found.")
+                st.warning("⚠️ No valid geohashes found.")
+            elif use_local_table:
+                # Dijawab dengan join ke tabel prakomputasi, tanpa unduh maupun clip
+                length_table = get_length_table(ROADS_PATH, os.path.getmtime(ROADS_PATH))
+                st.session_state['length_summary'] = length_table.frame(geohash_list)
             else:
                 st.info(f"🔍 Fetching clipped roads from {len(geohash_list)} geohash6 areas...")
-
-                gdf_roads = download_clipped_roads_from_geohashes(geohash_list)
-
-                if gdf_roads.empty:
-                    st.warning("⚠️ No roads found inside all geohashes.")
-                else:
-                    gdf_roads_metric = gdf_roads.to_crs(epsg=3857)
-                    total_length_km = gdf_roads_metric.length.sum() / 1000
-
-                    st.success(f"✅ {len(gdf_roads)} clipped road segments found.")
-                    st.info(f"🧮 Total road length: **{total_length_km:.2f} km**")
-
-                    gdf_roads = gdf_roads.to_crs(epsg=4326)
-                    st.session_state['gdf_roads'] = gdf_roads  # simpan ke session
+                gdf_roads, failed_cells = download_clipped_roads_from_geohashes(geohash_list, cache, int(workers), int(retries))
+                st.session_state['gdf_roads'] = gdf_roads  # simpan ke session
+                st.session_state['failed_cells'] = failed_cells
 
     except Exception as e:
         st.error(f"❌ Unexpected error: {e}")
 
-# Tombol download muncul hanya jika sudah ada hasil
+# Sel yang gagal bisa diunduh ulang tanpa mengulang sel yang sudah berhasil
+failed_cells = st.session_state['failed_cells']
+if failed_cells:
+    st.warning(f"⚠️ {len(failed_cells)} geohash gagal diunduh; total UKM di bawah belum lengkap.")
+    st.dataframe(pd.DataFrame({'geoHash': list(failed_cells), 'error': list(failed_cells.values())}))
+    if st.button("🔁 Retry failed geohashes"):
+        gdf_retry, failed_cells = download_clipped_roads_from_geohashes(list(failed_cells), cache, int(workers), int(retries))
+        st.session_state['gdf_roads'] = pd.concat(
+            [st.session_state['gdf_roads'], gdf_retry], ignore_index=True
+        )
+        st.session_state['failed_cells'] = failed_cells
+        st.rerun()
+
+# Ringkasan dari tabel panjang jalan lokal
+if st.session_state['length_summary'] is not None:
+    summary = st.session_state['length_summary']
+    st.success(f"✅ {(summary['total_km'] > 0).sum():,} of {len(summary):,} geohashes have roads.")
+    st.info(f"🧮 Total road length: **{summary['total_km'].sum():.2f} km**")
+    st.dataframe(summary, use_container_width=True)
+    st.download_button("⬇️ Download Road Length per Geohash", summary.to_csv(index=False),
+                       "road_length_per_geohash.csv", "text/csv")
+
+    level_name = st.selectbox("🧊 Rollup level", list(ROLLUP_LEVELS))
+    cube = get_rollup_cube(ROADS_PATH, os.path.getmtime(ROADS_PATH))
+    if isinstance(ROLLUP_LEVELS[level_name], str) and ROLLUP_LEVELS[level_name] not in cube.fields:
+        st.warning(f"⚠️ Batas wilayah untuk {level_name} tidak tersedia.")
+    else:
+        rolled = rollup_summary(summary, cube, ROLLUP_LEVELS[level_name], get_regions())
+        st.caption("`area_total_km`: total panjang jalan seluruh area/wilayah dari kubus rollup.")
+        st.dataframe(rolled, use_container_width=True)
+        st.download_button("⬇️ Download Rollup", rolled.to_csv(index=False),
+                           f"road_length_per_{level_name.lower()}.csv", "text/csv")
+
+# Ringkasan dan tombol download muncul hanya jika sudah ada hasil
 if st.session_state['gdf_roads'] is not None:
-    buffer = io.BytesIO()
-    st.session_state['gdf_roads'].to_file(buffer, driver="GeoJSON")
-    buffer.seek(0)
-    st.download_button("⬇️ Download Roads", buffer, "roads_inside_geohash.geojson", "application/geo+json")
+    gdf_roads = st.session_state['gdf_roads']
+    if gdf_roads.empty:
+        st.warning("⚠️ No roads found inside all geohashes.")
+    else:
+        total_length_km = gdf_roads['length_km'].sum()
+
+        st.success(f"✅ {len(gdf_roads)} clipped road segments found.")
+        cache_stats = cache.stats()
+        st.caption(f"🗃️ OSM tile cache: {cache_stats['hits']:,} hit / {cache_stats['misses']:,} miss, "
+                   f"{cache_stats['tiles']:,} tile ({cache_stats['bytes'] / 1e6:.1f} MB)")
+        st.info(f"🧮 Total road length: **{total_length_km:.2f} km**")
+
+        buffer = io.BytesIO()
+        gdf_roads.to_file(buffer, driver="GeoJSON")
+        buffer.seek(0)
+        st.download_button("⬇️ Download Roads", buffer, "roads_inside_geohash.geojson", "application/geo+json")
 
 # Footer
 st.markdown(
@@ -0,0 +1,90 @@
+"""Fetch engine retries, failures and rate limit against a local HTTP stub."""
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from karta.fetch_engine import RateLimiter, run_jobs, shared_limiter
+
+
+class _StubOverpass(BaseHTTPRequestHandler):
+    # Path /ok/<n>: gagal (429) untuk n permintaan pertama, lalu 200; /down: selalu 503
+    hits = {}
+    times = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.times.append(time.monotonic())
+            count = self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "ok" and count > int(parts[1]):
+            body = json.dumps({"path": self.path, "attempt": count}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(429 if parts[0] == "ok" else 503)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    _StubOverpass.hits, _StubOverpass.times = {}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOverpass)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(base):
+    def fetch(path):
+        with urllib.request.urlopen(base + path, timeout=5) as response:
+            return json.load(response)
+    return fetch
+
+
+def test_retries_until_success(stub):
+    results = {job: (result, error) for job, result, error in
+               run_jobs(["/ok/0", "/ok/2"], _get(stub), workers=2, rate=0, retries=3, backoff=0)}
+    assert results["/ok/0"] == ({"path": "/ok/0", "attempt": 1}, None)
+    assert results["/ok/2"] == ({"path": "/ok/2", "attempt": 3}, None)
+
+
+def test_failure_reported_after_last_retry(stub):
+    (job, result, error), = run_jobs(["/down"], _get(stub), rate=0, retries=2, backoff=0)
+    assert result is None
+    assert "503" in str(error)
+    assert _StubOverpass.hits["/down"] == 3
+
+
+def test_rate_limit_spaces_requests(stub):
+    jobs = [f"/ok/0?{i}" for i in range(5)]
+    list(run_jobs(jobs, _get(stub), workers=4, rate=20, retries=0))
+    gaps = [b - a for a, b in zip(_StubOverpass.times, _StubOverpass.times[1:])]
+    assert len(gaps) == 4
+    # Toleransi kecil untuk jitter penjadwalan thread
+    assert min(gaps) > 0.04
+
+
+def test_shared_limiter_keeps_first_rate():
+    first = shared_limiter("test://endpoint", 5)
+    assert shared_limiter("test://endpoint", 100) is first
+    assert first.interval == pytest.approx(0.2)
+    assert shared_limiter("test://other", 100) is not first
+
+
+def test_limiter_without_rate_does_not_wait():
+    limiter = RateLimiter(0)
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.1
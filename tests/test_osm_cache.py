@@ -0,0 +1,118 @@
+"""Tile cache TTL, LRU eviction and de-duplication with a stand-in fetcher."""
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from karta import codec, osm_cache
+from karta.osm_cache import MissingTilesError, TileCache
+
+TAGS = {"highway": True}
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class _Fetcher:
+    """Stand-in for Overpass: returns the features of ``gdf`` meeting the query box."""
+
+    def __init__(self, gdf):
+        self.gdf = gdf
+        self.boxes = []
+
+    def __call__(self, bbox, tags):
+        self.boxes.append(bbox)
+        return self.gdf[shapely.intersects(self.gdf.geometry.values, shapely.box(*bbox))]
+
+
+def _tiles(n, precision=5):
+    """``n`` tiles side by side (west to east) starting in Jakarta."""
+    x, y = codec.to_xy(codec.encode_int(np.array([-6.2]), np.array([106.8]), precision), precision)
+    codes = codec.from_xy(x[0] + np.arange(n, dtype=np.uint64), np.repeat(y, n), precision)
+    return codec.to_str(codes, precision).tolist()
+
+
+def _centre(tile):
+    w, s, e, n = codec.bounds([tile])[0]
+    return (w + e) / 2, (s + n) / 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(osm_cache, "time", clock)
+    return clock
+
+
+def _roads(tiles):
+    # Satu jalan melintasi dua tile pertama, satu jalan di tiap tile
+    (x0, y0), (x1, y1) = _centre(tiles[0]), _centre(tiles[1])
+    lines = [shapely.LineString([(x0, y0), (x1, y1)])]
+    lines += [shapely.LineString([_centre(t), (_centre(t)[0] + 1e-3, _centre(t)[1])]) for t in tiles]
+    return gpd.GeoDataFrame({"osm_type": "way", "osm_id": np.arange(len(lines)), "highway": "primary"},
+                            geometry=lines, crs="EPSG:4326")
+
+
+def test_feature_across_tiles_loaded_once(tmp_path, clock):
+    tiles = _tiles(2)
+    cache = TileCache(tmp_path, fetcher=_Fetcher(_roads(tiles)), retries=0)
+    gdf = cache.get(tiles, TAGS)
+    assert sorted(gdf["osm_id"]) == [0, 1, 2]
+
+
+def test_features_without_ids_are_not_collapsed(tmp_path, clock):
+    tiles = _tiles(2)
+    roads = _roads(tiles).drop(columns=["osm_type", "osm_id"])
+    cache = TileCache(tmp_path, fetcher=_Fetcher(roads), retries=0)
+    gdf = cache.get(tiles, TAGS)
+    # Tiga fitur berbeda; jalan lintas tile tetap satu
+    assert len(gdf) == 3
+    assert gdf.geometry.apply(lambda g: g.wkb).nunique() == 3
+
+
+def test_ttl_refetches_expired_tiles(tmp_path, clock):
+    tiles = _tiles(2)
+    fetcher = _Fetcher(_roads(tiles))
+    cache = TileCache(tmp_path, fetcher=fetcher, ttl=100, retries=0)
+    cache.get(tiles, TAGS)
+    calls = len(fetcher.boxes)
+    clock.now += 50
+    cache.get(tiles, TAGS)
+    assert len(fetcher.boxes) == calls
+    assert cache.stats()["hits"] == 2
+    clock.now += 100
+    assert cache.missing(tiles, TAGS) == tiles
+    cache.get(tiles, TAGS)
+    assert len(fetcher.boxes) > calls
+
+
+def test_lru_eviction_keeps_requested_tiles(tmp_path, clock):
+    tiles = _tiles(4)
+    cache = TileCache(tmp_path, fetcher=_Fetcher(_roads(tiles)), retries=0)
+    for tile in tiles:
+        clock.now += 1
+        cache.get([tile], TAGS)
+    size = cache.stats()["bytes"] // len(tiles)
+    # Tile pertama dipakai lagi, jadi tile kedua yang paling lama tidak dipakai
+    clock.now += 1
+    cache.load([tiles[0]], TAGS)
+
+    cache.max_bytes = size * 3
+    clock.now += 1
+    cache.prefetch([tiles[3]], TAGS)
+    key = osm_cache.tag_key(TAGS)
+    assert not cache._tile_path(key, tiles[1]).exists()
+    assert all(cache._tile_path(key, t).exists() for t in (tiles[0], tiles[2], tiles[3]))
+    assert cache.stats()["evictions"] == 1
+
+    # Tile yang sedang diminta tidak dibuang walau melebihi batas
+    cache.max_bytes = 0
+    cache.prefetch([tiles[3]], TAGS)
+    assert cache._tile_path(key, tiles[3]).exists()
+    with pytest.raises(MissingTilesError):
+        cache.load([tiles[0]], TAGS)